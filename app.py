@@ -2,32 +2,156 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g, Response, abort
+import json
 import uuid
-from datetime import datetime, timedelta
-from yelp_client import get_candidates_from_yelp_ai
-import random
+import time
+from yelp_client import (search_preferences, preferences_search_key, candidate_cache, yelp_http, restaurant_index,
+                         POOL_PAGE_SIZE)
+from circuit_breaker import CircuitOpenError
+from search_jobs import SearchJobQueue, QueueFullError
+from session_store import create_store, start_reaper
+from session_model import Session, SnapshotCache
+from voting import set_candidates
+import session_ops
+from session_ops import ActionError
+from candidate_pool import start_pool, clear_pool, extend_pool, has_next, serve_next, claim_prefetch
+from metrics import Counter, Gauge, Histogram, default_registry
+from structured_log import get_logger
+from assets import AssetPipeline
 
-app = Flask(__name__)
+# /static is served by the asset pipeline below
+app = Flask(__name__, static_folder=None)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 
-sessions = {}
+assets = AssetPipeline(os.path.join(app.root_path, 'static'))
+app.jinja_env.globals['asset_url'] = assets.url
+
+log = get_logger('app')
+
+sessions = create_store()
+start_reaper(sessions, float(os.getenv('SESSION_REAP_INTERVAL', 30)))
+
+# Longest a client may hold a GET /api/session/<id>?since=<version> request
+LONG_POLL_MAX_SECONDS = float(os.getenv('LONG_POLL_MAX_SECONDS', 25))
+
+search_jobs = SearchJobQueue(
+    max_workers=int(os.getenv('SEARCH_WORKERS', 8)),
+    max_pending=int(os.getenv('SEARCH_MAX_PENDING', 64))
+)
+
+# Prefetch the next page once fewer unseen pooled businesses than this remain
+PREFETCH_LOW_WATER = int(os.getenv('POOL_PREFETCH_LOW_WATER', 12))
+
+# Encoded GET /api/session bodies, reused until the session's version moves
+snapshots = SnapshotCache(int(os.getenv('SESSION_SNAPSHOT_CACHE_SIZE', 2048)))
+
+# Participant actions accepted by one POST /api/session/<id>/batch
+MAX_BATCH_OPS = int(os.getenv('BATCH_MAX_OPS', 20))
+
+# A session stuck in 'searching' this long (e.g. its worker died) can search again
+SEARCH_STALE_SECONDS = float(os.getenv('SEARCH_STALE_SECONDS', 60))
+
+http_latency = Histogram(
+    'pickit_http_request_duration_seconds',
+    'Request duration by route, method and status',
+    ('route', 'method', 'status')
+)
+http_in_flight = Gauge('pickit_http_requests_in_flight', 'Requests currently being handled')
+# A SQLite store already counts every worker's sessions; memory stores are per worker
+store_mode = 'sum' if os.getenv('SESSION_BACKEND', 'memory').lower() == 'memory' else 'live'
+sessions_live = Gauge('pickit_sessions_live', 'Sessions held by the session store', mode=store_mode)
+session_store_bytes = Gauge('pickit_session_store_bytes', 'Serialized size of stored sessions', mode=store_mode)
+searches_pending = Gauge('pickit_search_jobs_pending', 'Distinct candidate searches queued or running')
+votes_total = Counter('pickit_votes_total', 'Votes recorded')
+decisions_total = Counter('pickit_decisions_total', 'Sessions that reached a winner')
+
+def collect_gauges():
+    stats = sessions.stats()
+    sessions_live.set(stats['sessions'])
+    session_store_bytes.set(stats['bytes'])
+    searches_pending.set(search_jobs.pending())
+
+default_registry.on_collect(collect_gauges)
+# With several gunicorn workers, give them a shared METRICS_DIR so any
+# worker's /api/metrics covers all of them
+if os.getenv('METRICS_DIR'):
+    default_registry.share(os.environ['METRICS_DIR'], float(os.getenv('METRICS_FLUSH_SECONDS', 5)))
+
+def session_snapshot(session_id, version=None):
+    """
+    Encoded public state of a session, or None if it does not exist. Only
+    loads the session when the cached snapshot is for an older version.
+    """
+    if version is None:
+        version = sessions.version(session_id)
+        if version is None:
+            return None
+    snapshot = snapshots.get(session_id, version)
+    if snapshot is None:
+        session = sessions.get(session_id)
+        if session is None:
+            return None
+        snapshot = snapshots.put(session_id, session)
+    return snapshot
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    http_in_flight.inc()
+
+@app.after_request
+def record_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        # Long-polls are held on purpose; kept apart so they do not swamp
+        # the latency of plain session fetches
+        if request.endpoint == 'get_session' and 'since' in request.args:
+            route += '?since='
+        http_latency.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+    return response
+
+@app.teardown_request
+def end_request(error):
+    # Teardown runs even when after_request does not
+    if g.pop('request_started', None) is not None:
+        http_in_flight.dec()
 
 @app.route('/')
 def landing():
-    return render_template('landing.html')
+    return assets.page('landing.html', render_template)
 
 @app.route('/app')
 def index():
-    return render_template('app.html')
+    return assets.page('app.html', render_template)
 
 @app.route('/s/<session_id>')
 def session_page(session_id):
-    return render_template('app.html')
+    return assets.page('app.html', render_template)
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    response = assets.serve(filename)
+    if response is None:
+        abort(404)
+    return response
 
 @app.route('/api/health')
 def health():
-    return jsonify({'status': 'healthy', 'service': 'pickit'})
+    return jsonify({
+        'status': 'healthy',
+        'service': 'pickit',
+        'sessions': sessions.stats(),
+        'yelp_cache': candidate_cache.stats(),
+        'yelp_http': yelp_http.stats(),
+        'restaurant_index': restaurant_index.stats() if restaurant_index else None,
+        'assets': assets.stats()
+    })
+
+@app.route('/api/metrics')
+def metrics():
+    return Response(default_registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/create', methods=['POST'])
 def create_session():
@@ -43,22 +167,11 @@ def create_session():
         
         timeout_minutes = data.get('timeout', 15)
         
+        session = Session(host_name, location, time.time() + timeout_minutes * 60)
+        
         session_id = str(uuid.uuid4())[:8]
-        sessions[session_id] = {
-            'creator': host_name,
-            'location': location,
-            'preferences': [],
-            'participants': [],
-            'candidates': [],
-            'votes': {},
-            'status': 'collecting',
-            'started': False,
-            'winner': None,
-            'tie_breaker': False,
-            'error': None,
-            'timeout_at': (datetime.now() + timedelta(minutes=timeout_minutes)).isoformat(),
-            'created_at': datetime.now().isoformat()
-        }
+        while not sessions.create(session_id, session):
+            session_id = str(uuid.uuid4())[:8]
         
         return jsonify({
             'session_id': session_id,
@@ -71,267 +184,382 @@ def create_session():
 @app.route('/api/submit-preference/<session_id>', methods=['POST'])
 def submit_preference(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
-            return jsonify({'error': 'Session not found. Please check the link and try again.'}), 404
-        
-        if session['status'] != 'collecting':
-            return jsonify({'error': 'This session is no longer accepting preferences.'}), 400
-        
-        data = request.json
-        preference = data.get('preference', '').strip()
-        participant_name = data.get('participant_name', 'Anonymous')
-        
-        if not preference:
-            return jsonify({'error': 'Please enter a preference'}), 400
-        
-        if len(preference) > 500:
-            return jsonify({'error': 'Preference is too long (max 500 characters)'}), 400
-        
-        if not isinstance(session['preferences'], list):
-            session['preferences'] = []
-        
-        session['preferences'].append(preference)
-        
-        if participant_name not in session['participants']:
-            session['participants'].append(participant_name)
-        
-        return jsonify({
-            'message': 'Preference submitted',
-            'total_submitted': len(session['preferences']),
-            'participant_count': len(session['participants'])
-        })
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found. Please check the link and try again.'}), 404
+            
+            result = session_ops.submit_preference(session, request.json)
+            session.bump_version()
+            return jsonify(result)
+    except ActionError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         return jsonify({'error': f'Failed to submit preference: {str(e)}'}), 500
 
 @app.route('/api/remove-preference/<session_id>', methods=['POST'])
 def remove_preference(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        if session['status'] != 'collecting':
-            return jsonify({'error': 'Cannot remove preferences after voting started'}), 400
-        
-        data = request.json
-        index = data.get('index')
-        
-        if index is not None and 0 <= index < len(session['preferences']):
-            removed = session['preferences'].pop(index)
-            return jsonify({
-                'message': 'Preference removed',
-                'removed': removed,
-                'total_remaining': len(session['preferences'])
-            })
-        
-        return jsonify({'error': 'Invalid preference index'}), 400
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
+            
+            result = session_ops.remove_preference(session, request.json)
+            session.bump_version()
+            return jsonify(result)
+    except ActionError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         return jsonify({'error': f'Failed to remove preference: {str(e)}'}), 500
 
 @app.route('/api/reset-session/<session_id>', methods=['POST'])
 def reset_session(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        session['preferences'] = []
-        session['candidates'] = []
-        session['votes'] = {}
-        session['status'] = 'collecting'
-        session['started'] = False
-        session['winner'] = None
-        session['tie_breaker'] = False
-        session['error'] = None
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
+            
+            session.preferences = []
+            set_candidates(session, [])
+            session.status = 'collecting'
+            session.started = False
+            session.winner = None
+            session.tie_breaker = False
+            session.error = None
+            session.error_message = None
+            session.search_id = None
+            session.completed_at = None
+            clear_pool(session)
+            session.bump_version()
+        
+        # Outside the session lock, so no thread holds a session lock
+        # while waiting for the job queue's
+        search_jobs.cancel(session_id)
+        search_jobs.cancel(f'{session_id}:prefetch')
         
         return jsonify({
             'message': 'Session reset',
-            'status': session['status']
+            'status': 'collecting'
         })
     except Exception as e:
         return jsonify({'error': f'Failed to reset session: {str(e)}'}), 500
 
-@app.route('/api/start-voting/<session_id>', methods=['POST'])
-def start_voting(session_id):
+def describe_search_error(error):
+    """Map a failed candidate search to an (error_type, message) pair for the client"""
+    error_msg = str(error)
+    
+    if isinstance(error, CircuitOpenError) or 'API key' in error_msg or 'authentication' in error_msg.lower():
+        return 'api_auth', 'Restaurant search service is temporarily unavailable. Please try again later.'
+    elif 'network' in error_msg.lower() or 'connection' in error_msg.lower():
+        return 'network', 'Network connection error. Please check your internet and try again.'
+    else:
+        return 'api_error', f'Failed to find restaurants: {error_msg}'
+
+def finish_search(session_id, search_id, offset, result, error):
+    """Apply a finished search job to the session that started it"""
+    prefetch = None
+    with sessions.update(session_id) as session:
+        # A reset or a newer search (possibly in another worker) supersedes this one
+        if not session or session.search_id != search_id:
+            return
+        
+        previous_status = session.search_from
+        session.search_id = None
+        
+        found = False
+        if error is None and result['businesses']:
+            if offset is None:
+                start_pool(session, search_id, list(session.preferences))
+            extend_pool(session, result)
+            # A page of businesses already in the pool has nothing new to
+            # show; a short round is fine since Yelp was just asked for more
+            found = has_next(session, 1)
+        
+        if error is not None:
+            log.warning('candidate search failed', extra={'session_id': session_id, 'error': str(error)})
+            session.status = previous_status
+            session.error, session.error_message = describe_search_error(error)
+        elif not found:
+            session.status = previous_status
+            session.error = 'no_results'
+            if previous_status == 'voting':
+                session.pool_exhausted = True
+                session.error_message = 'No new restaurants found. Try adjusting your preferences.'
+            else:
+                session.error_message = f'No restaurants found matching your preferences in {session.location}. Try different preferences or location.'
+        else:
+            serve_next(session)
+            session.status = 'voting'
+            session.started = True
+            session.error = None
+            session.error_message = None
+            prefetch = pool_prefetch(session)
+        session.bump_version()
+    
+    if prefetch:
+        queue_prefetch(session_id, *prefetch)
+
+def pool_prefetch(session):
+    """Arguments for queue_prefetch if the session's pool is running low"""
+    offset = claim_prefetch(session, PREFETCH_LOW_WATER)
+    if offset is None:
+        return None
+    return session.pool_id, session.pool_preferences, session.location, offset
+
+def queue_prefetch(session_id, pool_id, preferences, location, offset):
+    """Fetch the next page of the pool in the background"""
+    def finish_prefetch(result, error):
+        with sessions.update(session_id) as session:
+            if not session or session.pool_id != pool_id or session.pool_offset != offset:
+                return
+            session.pool_prefetching = False
+            if error is not None:
+                log.warning('candidate prefetch failed', extra={'session_id': session_id, 'error': str(error)})
+                return
+            # The pool is not part of the public state, so no version bump
+            extend_pool(session, result)
+    
     try:
-        session = sessions.get(session_id)
+        search_jobs.submit(
+            f'{session_id}:prefetch',
+            preferences_search_key(preferences, location, POOL_PAGE_SIZE, offset),
+            lambda: search_preferences(preferences, location, POOL_PAGE_SIZE, offset),
+            finish_prefetch
+        )
+    except QueueFullError as e:
+        finish_prefetch(None, e)
+
+def enqueue_search(session_id, allowed_statuses, offset=None):
+    """
+    Move the session to 'searching' and queue a candidate search for it:
+    a new pool without `offset`, else the pool's page at `offset`.
+    Returns the response for start-voting / regenerate: 202 while the
+    search runs, the session state picks up the result.
+    """
+    with sessions.update(session_id) as session:
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
-        all_prefs = session['preferences']
+        if session.status == 'searching' and time.time() - session.search_started_at < SEARCH_STALE_SECONDS:
+            return jsonify({'message': 'Search already in progress', 'status': 'searching'}), 202
+        
+        if session.status not in allowed_statuses and session.status != 'searching':
+            return jsonify({'error': 'Not in voting phase'}), 400
+        
+        all_prefs = list(session.preferences)
         
         if not all_prefs:
             return jsonify({'error': 'No preferences submitted. Add at least one preference to start voting.'}), 400
         
         combined = ', '.join(all_prefs)
-        
-        try:
-            candidates = get_candidates_from_yelp_ai(combined, session['location'])
-            
-            if not candidates or len(candidates) == 0:
-                session['error'] = 'no_results'
-                return jsonify({
-                    'error': f'No restaurants found matching your preferences in {session["location"]}. Try different preferences or location.',
-                    'error_type': 'no_results'
-                }), 404
-            
-            session['candidates'] = candidates
-            session['status'] = 'voting'
-            session['started'] = True
-            session['error'] = None
-            
-            return jsonify({
-                'message': 'Voting started',
-                'candidates': candidates,
-                'combined_preferences': combined
-            })
-        except Exception as yelp_error:
-            session['error'] = 'api_error'
-            error_msg = str(yelp_error)
-            
-            if 'API key' in error_msg or 'authentication' in error_msg.lower():
-                return jsonify({
-                    'error': 'Restaurant search service is temporarily unavailable. Please try again later.',
-                    'error_type': 'api_auth'
-                }), 503
-            elif 'network' in error_msg.lower() or 'connection' in error_msg.lower():
-                return jsonify({
-                    'error': 'Network connection error. Please check your internet and try again.',
-                    'error_type': 'network'
-                }), 503
-            else:
-                return jsonify({
-                    'error': f'Failed to find restaurants: {error_msg}',
-                    'error_type': 'api_error'
-                }), 500
-                
+        location = session.location
+        search_id = uuid.uuid4().hex
+        previous_status = session.search_from if session.status == 'searching' else session.status
+        
+        session.status = 'searching'
+        session.search_id = search_id
+        session.search_from = previous_status
+        session.search_started_at = time.time()
+        session.error = None
+        session.error_message = None
+        session.bump_version()
+    
+    # Queued outside the session lock: a coalesced job that has already
+    # finished calls finish_search right away, which takes the lock itself
+    try:
+        search_jobs.submit(
+            session_id,
+            preferences_search_key(all_prefs, location, POOL_PAGE_SIZE, offset or 0, hedge=offset is None),
+            lambda: search_preferences(all_prefs, location, POOL_PAGE_SIZE, offset or 0, hedge=offset is None),
+            lambda result, error: finish_search(session_id, search_id, offset, result, error)
+        )
+    except QueueFullError:
+        with sessions.update(session_id) as session:
+            if session and session.search_id == search_id:
+                session.status = previous_status
+                session.search_id = None
+                session.bump_version()
+        return jsonify({
+            'error': 'Too many searches in progress. Please try again in a moment.',
+            'error_type': 'busy'
+        }), 503
+    
+    return jsonify({
+        'message': 'Searching',
+        'status': 'searching',
+        'combined_preferences': combined
+    }), 202
+
+@app.route('/api/start-voting/<session_id>', methods=['POST'])
+def start_voting(session_id):
+    try:
+        return enqueue_search(session_id, ('collecting', 'voting', 'completed', 'timeout'))
     except Exception as e:
         return jsonify({'error': f'Failed to start voting: {str(e)}'}), 500
 
 @app.route('/api/regenerate/<session_id>', methods=['POST'])
 def regenerate_candidates(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        if session['status'] != 'voting':
-            return jsonify({'error': 'Not in voting phase'}), 400
-        
-        all_prefs = session['preferences']
-        combined = ', '.join(all_prefs)
-        
-        try:
-            candidates = get_candidates_from_yelp_ai(combined, session['location'])
-            
-            if not candidates or len(candidates) == 0:
-                return jsonify({
-                    'error': 'No new restaurants found. Try adjusting your preferences.',
-                    'error_type': 'no_results'
-                }), 404
-            
-            session['candidates'] = candidates
-            session['votes'] = {}
-            session['error'] = None
-            
-            return jsonify({
-                'candidates': candidates,
-                'message': 'New options generated'
-            })
-        except Exception as yelp_error:
-            return jsonify({
-                'error': f'Failed to regenerate options: {str(yelp_error)}',
-                'error_type': 'api_error'
-            }), 500
+        prefetch = None
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
             
+            # Served from the session's pool when it has unseen businesses;
+            # only an empty pool goes back to Yelp
+            if session.status == 'voting' and has_next(session):
+                candidates = serve_next(session)
+                session.error = None
+                session.error_message = None
+                session.bump_version()
+                prefetch = pool_prefetch(session)
+                response = jsonify({
+                    'candidates': candidates,
+                    'message': 'New options generated'
+                })
+            else:
+                response = None
+                offset = session.pool_offset
+        
+        if prefetch:
+            queue_prefetch(session_id, *prefetch)
+        if response is not None:
+            return response
+        return enqueue_search(session_id, ('voting',), offset)
     except Exception as e:
         return jsonify({'error': f'Failed to regenerate: {str(e)}'}), 500
 
 @app.route('/api/session/<session_id>', methods=['GET'])
 def get_session(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
+        snapshot = session_snapshot(session_id)
+        if not snapshot:
             return jsonify({'error': 'Session not found or expired'}), 404
         
-        if datetime.now() > datetime.fromisoformat(session['timeout_at']):
-            if session['status'] != 'completed':
-                session['status'] = 'timeout'
-        
-        return jsonify(session)
+        # Long-poll: with ?since=<version>, hold the request until the
+        # session changes, it times out, or the wait runs out (204)
+        since = request.args.get('since', type=int)
+        if since is not None and snapshot.version <= since:
+            wait = min(request.args.get('wait', LONG_POLL_MAX_SECONDS, type=float), LONG_POLL_MAX_SECONDS)
+            # A finished session has nothing to time out, so its waits are
+            # not cut short at expires_at
+            if snapshot.status not in ('completed', 'timeout'):
+                wait = min(wait, snapshot.expires_at - time.time())
+            if wait > 0:
+                version = sessions.wait(session_id, since, wait)
+                if version is None:
+                    return jsonify({'error': 'Session not found or expired'}), 404
+                if version > since:
+                    snapshot = session_snapshot(session_id, version)
+                    if not snapshot:
+                        return jsonify({'error': 'Session not found or expired'}), 404
+        
+        if time.time() > snapshot.expires_at and snapshot.status not in ('completed', 'timeout'):
+            with sessions.update(session_id) as session:
+                if not session:
+                    return jsonify({'error': 'Session not found or expired'}), 404
+                if session.status not in ('completed', 'timeout'):
+                    session.status = 'timeout'
+                    session.bump_version()
+                snapshot = snapshots.put(session_id, session)
+        
+        if since is not None and snapshot.version <= since:
+            return '', 204
+        
+        # Unchanged since the client's last copy: 304 with no body
+        response = Response(snapshot.body, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': f'Failed to get session: {str(e)}'}), 500
 
 @app.route('/api/vote/<session_id>', methods=['POST'])
 def vote(session_id):
     try:
-        session = sessions.get(session_id)
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
-        
-        if session['status'] != 'voting':
-            return jsonify({'error': 'Voting is not currently active'}), 400
-        
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
+            
+            result = session_ops.vote(session, request.json)
+            session.bump_version()
+            count_vote(result)
+            return jsonify(result)
+    except ActionError as e:
+        return jsonify({'error': e.message}), e.status
+    except Exception as e:
+        return jsonify({'error': f'Failed to record vote: {str(e)}'}), 500
+
+def count_vote(result):
+    votes_total.inc()
+    if result['winner'] is not None:
+        decisions_total.inc()
+
+@app.route('/api/session/<session_id>/batch', methods=['POST'])
+def batch(session_id):
+    """
+    Apply several participant actions at once and answer with the new
+    session state, so an action needs no follow-up GET.
+    
+    Body: {"ops": [{"op": "submit-preference" | "remove-preference" | "vote", ...}],
+    "since": <version>}, each op carrying its endpoint's fields. The ops
+    run in order under one session lock and either all apply or none do.
+    The answer has each op's result and the state: "session" in full, or
+    only the "changes" since `since` when that is the version the batch
+    started from.
+    """
+    try:
         data = request.json
-        candidate_id = data.get('candidate_id')
-        
-        if not candidate_id:
-            return jsonify({'error': 'No candidate selected'}), 400
-        
-        if not any(c['id'] == candidate_id for c in session['candidates']):
-            return jsonify({'error': 'Invalid candidate selected'}), 400
-        
-        voter_id = request.remote_addr + str(datetime.now().timestamp())
-        
-        session['votes'][voter_id] = candidate_id
-        
-        vote_counts = {}
-        for vid, cid in session['votes'].items():
-            vote_counts[cid] = vote_counts.get(cid, 0) + 1
-        
-        num_preferences = len(session['preferences'])
-        votes_cast = len(session['votes'])
-        
-        for cid, count in vote_counts.items():
-            if count > (num_preferences / 2):
-                winner = next((c for c in session['candidates'] if c['id'] == cid), None)
-                session['winner'] = winner
-                session['status'] = 'completed'
-                session['tie_breaker'] = False
-                
-                return jsonify({
-                    'winner': winner,
-                    'total_votes': votes_cast,
-                    'winning_votes': count,
-                    'tie_breaker': False
-                })
-        
-        if votes_cast >= num_preferences and vote_counts:
-            max_votes = max(vote_counts.values())
-            tied = [cid for cid, count in vote_counts.items() if count == max_votes]
+        ops = data.get('ops') if isinstance(data, dict) else None
+        if not isinstance(ops, list) or not ops or not all(isinstance(op, dict) for op in ops):
+            return jsonify({'error': 'Expected a non-empty list of ops'}), 400
+        if len(ops) > MAX_BATCH_OPS:
+            return jsonify({'error': f'At most {MAX_BATCH_OPS} ops per batch'}), 400
+        unknown = next((i for i, op in enumerate(ops) if op.get('op') not in session_ops.ACTIONS), None)
+        if unknown is not None:
+            return jsonify({'error': f"Unknown op: {ops[unknown].get('op')}", 'failed_op': unknown}), 400
+        since = data.get('since')
+        
+        with sessions.update(session_id) as session:
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
             
-            winner_id = random.choice(tied)
-            winner = next((c for c in session['candidates'] if c['id'] == winner_id), None)
+            before = None
+            if since == session.version:
+                before = snapshots.get(session_id, since) or snapshots.put(session_id, session)
+            # A single action validates before changing anything; only a
+            # longer batch may need rolling back
+            checkpoint = session.checkpoint() if len(ops) > 1 else None
+            results = []
+            try:
+                for index, op in enumerate(ops):
+                    results.append(session_ops.ACTIONS[op['op']](session, op))
+            except BaseException as e:
+                if checkpoint is not None:
+                    session.restore(checkpoint)
+                if isinstance(e, ActionError):
+                    return jsonify({'error': e.message, 'failed_op': index}), e.status
+                raise
             
-            session['winner'] = winner
-            session['status'] = 'completed'
-            session['tie_breaker'] = len(tied) > 1
+            session.bump_version()
+            for op, result in zip(ops, results):
+                if op['op'] == 'vote':
+                    count_vote(result)
+            after = snapshots.put(session_id, session)
             
-            return jsonify({
-                'winner': winner,
-                'total_votes': votes_cast,
-                'winning_votes': max_votes,
-                'tie_breaker': len(tied) > 1
-            })
+            if before is not None:
+                return jsonify({
+                    'results': results,
+                    'version': after.version,
+                    'since': since,
+                    'changes': {name: getattr(session, name) for name in after.changed_fields(before)}
+                })
         
-        return jsonify({
-            'total_votes': votes_cast,
-            'expected_votes': num_preferences,
-            'winner': None
-        })
+        body = b'{"results":%s,"version":%d,"session":%s}' % (
+            json.dumps(results, separators=(',', ':')).encode(), after.version, after.body
+        )
+        return Response(body, mimetype='application/json')
     except Exception as e:
-        return jsonify({'error': f'Failed to record vote: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to apply actions: {str(e)}'}), 500
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
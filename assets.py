@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fingerprinted URLs never change content, so browsers may keep them for good
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Smaller bodies are not worth a Content-Encoding header
+MIN_COMPRESS_BYTES = 512
+
+
+class Encoded:
+    """One body in every encoding worth sending, with an ETag per encoding"""
+
+    __slots__ = ('mimetype', 'digest', 'variants')
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants: Dict[str, bytes] = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=11)
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            # Keep only encodings that actually shrink the body
+            for encoding in [e for e in self.variants if e != 'identity']:
+                if len(self.variants[encoding]) >= len(body):
+                    del self.variants[encoding]
+
+    def choose(self) -> Tuple[str, bytes]:
+        """The smallest variant the request's Accept-Encoding allows"""
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted[encoding] > 0:
+                return encoding, self.variants[encoding]
+        return 'identity', self.variants['identity']
+
+    def response(self, cache_control: str) -> Response:
+        encoding, body = self.choose()
+        response = Response(body, mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = cache_control
+        # Each encoding is a different representation, so it gets its own ETag
+        response.set_etag(f'{self.digest[:16]}-{encoding}')
+        return response.make_conditional(request)
+
+
+class AssetPipeline:
+    """
+    Static files fingerprinted, precompressed and held in memory.
+
+    Every file under `static_dir` is read once at startup and served at
+    /static/<name>.<hash>.<ext> with an immutable Cache-Control; templates
+    get those URLs from asset_url(). The plain /static/<name> keeps working
+    for old pages but must be revalidated. Rendered pages are cached the
+    same way on first use, since none of them depend on the request.
+    """
+
+    def __init__(self, static_dir: str, url_prefix: str = '/static'):
+        self.url_prefix = url_prefix
+        self._files: Dict[str, Encoded] = {}
+        # fingerprinted name -> plain name
+        self._fingerprinted: Dict[str, str] = {}
+        self._urls: Dict[str, str] = {}
+        for root, _, names in os.walk(static_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    body = f.read()
+                mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if mimetype.startswith('text/') or mimetype == 'application/javascript':
+                    mimetype += '; charset=utf-8'
+                encoded = self._files[relative] = Encoded(body, mimetype)
+                stem, ext = os.path.splitext(relative)
+                fingerprinted = f'{stem}.{encoded.digest[:12]}{ext}'
+                self._fingerprinted[fingerprinted] = relative
+                self._urls[relative] = f'{url_prefix}/{fingerprinted}'
+        self._pages: Dict[str, Encoded] = {}
+        self._pages_lock = threading.Lock()
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL of a static file, or the plain one if it is unknown"""
+        return self._urls.get(name, f'{self.url_prefix}/{name}')
+
+    def serve(self, filename: str) -> Optional[Response]:
+        """Response for /static/<filename>, or None if there is no such file"""
+        name = self._fingerprinted.get(filename)
+        if name is not None:
+            return self._files[name].response(IMMUTABLE)
+        encoded = self._files.get(filename)
+        if encoded is not None:
+            return encoded.response('no-cache')
+        return None
+
+    def page(self, template: str, render: Callable[[str], str]) -> Response:
+        """A request-independent page, rendered once and revalidated by ETag"""
+        encoded = self._pages.get(template)
+        if encoded is None:
+            with self._pages_lock:
+                encoded = self._pages.get(template)
+                if encoded is None:
+                    encoded = Encoded(render(template).encode(), 'text/html; charset=utf-8')
+                    self._pages[template] = encoded
+        return encoded.response('no-cache')
+
+    def stats(self) -> Dict:
+        return {
+            'files': len(self._files),
+            'pages': len(self._pages),
+            'bytes': sum(len(v) for e in self._files.values() for v in e.variants.values()),
+            'brotli': brotli is not None
+        }
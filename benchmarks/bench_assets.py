@@ -0,0 +1,94 @@
+"""
+Bytes and worker CPU per page view, before and after the asset pipeline.
+
+A page view is GET /s/<id> plus the stylesheet and script it links.
+"before" is the previous setup, mounted on the same app under /legacy
+so both pay for the same request hooks: render_template on every hit
+and Flask's send_from_directory, uncompressed. "after" is the app as
+shipped. CPU is only counted while the app handles a request. A first
+view starts with an empty browser cache; a repeat view sends the
+validators the first one got and skips assets whose Cache-Control is
+immutable, as browsers do.
+
+    python benchmarks/bench_assets.py --views 2000
+"""
+import argparse
+import gzip
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import render_template, send_from_directory
+
+from app import app
+
+HEADERS = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def mount_legacy():
+    @app.route('/legacy/s/<session_id>')
+    def legacy_session_page(session_id):
+        html = render_template('app.html')
+        return re.sub(r'/static/(\w+)\.\w{12}\.', r'/legacy/static/\1.', html)
+
+    @app.route('/legacy/static/<path:filename>')
+    def legacy_static(filename):
+        return send_from_directory(os.path.join(app.root_path, 'static'), filename)
+
+
+def page_view(client, prefix, cache):
+    """
+    Load a page like a browser with `cache` (url -> (validators,
+    immutable)); returns bytes received and CPU seconds spent in requests
+    """
+    received = 0
+    cpu = 0.0
+    urls = [f'{prefix}/s/abc123']
+    while urls:
+        url = urls.pop(0)
+        validators, immutable = cache.get(url, ({}, False))
+        if immutable:
+            continue
+        start = time.process_time()
+        response = client.get(url, headers={**HEADERS, **validators})
+        received += len(response.data)
+        cpu += time.process_time() - start
+        if response.status_code == 200:
+            seen = {}
+            if response.headers.get('ETag'):
+                seen['If-None-Match'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                seen['If-Modified-Since'] = response.headers['Last-Modified']
+            cache[url] = (seen, 'immutable' in response.headers.get('Cache-Control', ''))
+            if '/s/' in url:
+                body = response.get_data()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                urls.extend(re.findall(r'"(/[\w/]*static/[^"]+)"', body.decode()))
+        response.close()
+    return received, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--views', type=int, default=2000)
+    args = parser.parse_args()
+
+    mount_legacy()
+    client = app.test_client()
+    print(f"{'':>7} {'first view B':>13} {'repeat view B':>14} {'first ms CPU':>13} {'repeat ms CPU':>14}")
+    for label, prefix in (('before', '/legacy'), ('after', '')):
+        cache = {}
+        page_view(client, prefix, cache)
+        first_bytes, _ = page_view(client, prefix, {})
+        repeat_bytes, _ = page_view(client, prefix, dict(cache))
+        first_cpu = sum(page_view(client, prefix, {})[1] for _ in range(args.views)) / args.views
+        repeat_cpu = sum(page_view(client, prefix, dict(cache))[1] for _ in range(args.views)) / args.views
+        print(f"{label:>7} {first_bytes:>13} {repeat_bytes:>14} {first_cpu * 1000:>13.3f} {repeat_cpu * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Single combined-term search vs the planned fan-out of search_preferences.
+
+Both run against the offline Yelp stub with the result cache disabled.
+For each group size, random participant preferences are searched both
+ways; the table shows median wall-clock time per search, the length of
+the term(s) sent, and how many of the group's preferences the six
+candidates shown first satisfy on average.
+
+    python benchmarks/bench_fanout.py --latency-ms 300 --rounds 10
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from yelp_stub import start_stub
+
+PREFERENCES = [
+    'spicy thai food', 'thai curry', 'tacos', 'cheap tacos please', 'mexican', 'sushi', 'ramen',
+    'japanese', 'vegan options', 'something vegan', 'bbq', 'barbeque ribs', 'burgers and fries',
+    'pizza', 'italian pasta', 'indian', 'chinese dumplings', 'seafood', 'brunch', 'mediterranean',
+    "I'd really like a place with good seafood and outdoor seating near the water " * 3
+]
+
+
+def satisfied(preference_stems, candidates, business_stems):
+    """Average number of preferences each shown candidate satisfies"""
+    total = 0
+    for biz in candidates:
+        stems = business_stems(biz)
+        total += sum(1 for wanted in preference_stems if wanted & stems)
+    return total / max(1, len(candidates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--group-sizes', type=int, nargs='+', default=[2, 5, 10, 20])
+    args = parser.parse_args()
+
+    stub, _ = start_stub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=1)
+    os.environ.update(
+        YELP_API_KEY='stub',
+        YELP_SEARCH_ENDPOINT=f'http://127.0.0.1:{stub.server_port}/v3/businesses/search',
+        YELP_CACHE_TTL='0',
+        YELP_CACHE_STALE_TTL='0'
+    )
+    import yelp_client
+    from preferences import _business_stems, _stem, plan_queries, preference_words
+
+    rng = random.Random(7)
+    print(f"{'prefs':>6} {'single ms':>10} {'fan-out ms':>11} {'single term':>12} {'sub-terms':>10} "
+          f"{'single fit':>11} {'fan-out fit':>12}")
+    for size in args.group_sizes:
+        single_times, fanout_times, single_fit, fanout_fit = [], [], [], []
+        term_chars = sub_chars = 0
+        for _ in range(args.rounds):
+            prefs = [rng.choice(PREFERENCES) for _ in range(size)]
+            stems = [{_stem(w) for w in preference_words(p)} for p in prefs]
+            combined = ', '.join(prefs)
+            term_chars = len(combined)
+            sub_chars = max(len(q.term) for q in plan_queries(prefs))
+
+            start = time.perf_counter()
+            single = yelp_client._search(combined, 'Atlanta, GA', yelp_client.POOL_PAGE_SIZE, 0)
+            single_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            page = yelp_client.search_preferences(prefs, 'Atlanta, GA')
+            fanout_times.append(time.perf_counter() - start)
+
+            single_fit.append(satisfied(stems, single[:6], _business_stems))
+            fanout_fit.append(satisfied(stems, page['businesses'][:6], _business_stems))
+
+        print(f"{size:>6} {statistics.median(single_times) * 1000:>10.0f} "
+              f"{statistics.median(fanout_times) * 1000:>11.0f} {term_chars:>12} {sub_chars:>10} "
+              f"{statistics.mean(single_fit):>11.2f} {statistics.mean(fanout_fit):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
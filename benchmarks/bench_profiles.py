@@ -0,0 +1,84 @@
+"""
+Most concurrent sessions each gunicorn profile serves within a p99 budget.
+
+For each GUNICORN_PROFILE the app is started with gunicorn.conf.py and
+the load test flow is run at a growing number of concurrent sessions.
+A step passes when every session reaches a winner and the p99 of the
+non-long-poll requests stays under --p99-ms; long-polls are left out
+since they are meant to wait. The first failing step ends the ramp.
+
+    python benchmarks/bench_profiles.py --sessions 10 20 40 80 160 --p99-ms 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from loadtest import Recorder, percentile, run_session, start_server, stop_server
+from yelp_stub import start_stub
+
+
+def run_step(base_url, args, sessions):
+    """Run `sessions` concurrent sessions; returns (p99 seconds, failed sessions, requests)"""
+    recorder = Recorder()
+    threads = [threading.Thread(target=run_session, args=(base_url, recorder, args)) for _ in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies = sorted(
+        value for name, values in recorder.latencies.items() if 'long-poll' not in name for value in values
+    )
+    requests = sum(len(values) for values in recorder.latencies.values())
+    return percentile(latencies, 0.99), recorder.failed_sessions + sessions - recorder.decisions, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--profiles', nargs='+', default=['sync', 'gevent'])
+    parser.add_argument('--sessions', type=int, nargs='+', default=[10, 20, 40, 80, 160])
+    parser.add_argument('--participants', type=int, default=4)
+    parser.add_argument('--p99-ms', type=float, default=1000.0)
+    parser.add_argument('--session-timeout', type=float, default=60.0)
+    parser.add_argument('--stub-latency-ms', type=float, default=300.0)
+    parser.add_argument('--port', type=int, default=8902)
+    args = parser.parse_args()
+    # What loadtest's Participant and start_server read
+    args.poll_interval = 2.0
+    args.api = 'batch'
+    args.preferences = ['tacos', 'sushi', 'pizza', 'thai', 'bbq', 'vegan']
+    args.gunicorn_args = '-c gunicorn.conf.py'
+    args.no_cache = False
+
+    stub, _ = start_stub(latency_ms=args.stub_latency_ms, jitter_ms=args.stub_latency_ms / 4)
+    print(f"{'profile':>8} {'sessions':>9} {'p99 ms':>9} {'failed':>7} {'requests':>9}")
+    best = {}
+    base_port = args.port
+    for i, profile in enumerate(args.profiles):
+        os.environ['GUNICORN_PROFILE'] = profile
+        # Clients poll on an interval where gunicorn.conf.py turns long-poll off
+        args.poll_mode = 'long' if profile == 'gevent' else 'interval'
+        # A fresh port, in case workers of the previous profile are still draining
+        args.port = base_port + i
+        process, base_url = start_server(args, stub.server_port, tempfile.mkdtemp(prefix='pickit-profile-'))
+        best[profile] = 0
+        try:
+            for sessions in args.sessions:
+                p99, failed, requests = run_step(base_url, args, sessions)
+                print(f"{profile:>8} {sessions:>9} {p99 * 1000:>9.0f} {failed:>7} {requests:>9}")
+                if failed or p99 * 1000 > args.p99_ms:
+                    break
+                best[profile] = sessions
+        finally:
+            stop_server(process)
+
+    print()
+    for profile, sessions in best.items():
+        print(f'{profile}: {sessions} concurrent sessions of {args.participants} within p99 {args.p99_ms:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
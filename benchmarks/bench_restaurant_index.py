@@ -0,0 +1,84 @@
+"""
+Restaurant index lookup latency and the upstream calls it saves.
+
+Lookup: the fixture businesses are indexed under --locations cities and
+random terms are looked up. Quota: --groups random preference groups in
+one city are searched through search_preferences against the offline
+Yelp stub (result cache disabled), once without the index and once with
+it, counting the requests the stub receives.
+
+    python benchmarks/bench_restaurant_index.py --locations 20 --groups 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from yelp_stub import start_stub
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+TERMS = ['thai', 'tacos', 'sushi', 'ramen', 'vegan', 'bbq', 'barbeque', 'burgers', 'pizza', 'italian',
+         'indian', 'chinese', 'seafood', 'brunch', 'mediterranean', 'mexican', 'japanese']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--locations', type=int, default=20)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=200)
+    parser.add_argument('--group-size', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='pickit-index-')
+    stub, stub_config = start_stub(latency_ms=0)
+    os.environ.update(
+        YELP_API_KEY='stub',
+        YELP_SEARCH_ENDPOINT=f'http://127.0.0.1:{stub.server_port}/v3/businesses/search',
+        YELP_CACHE_TTL='0',
+        YELP_CACHE_STALE_TTL='0',
+        RESTAURANT_INDEX_PATH=os.path.join(tmp, 'restaurants.db'),
+        RESTAURANT_INDEX_MIN_BUSINESSES='50',
+        RESTAURANT_INDEX_MIN_RESULTS='6'
+    )
+    import yelp_client
+    index = yelp_client.restaurant_index
+
+    with open(os.path.join(FIXTURES, 'businesses_search.json')) as f:
+        businesses = [yelp_client.slim_business(biz) for biz in json.load(f)['businesses']]
+    for i in range(args.locations):
+        index.add(f'City {i}, GA', businesses, yelp_client.candidate_snippet)
+
+    rng = random.Random(3)
+    timings = []
+    for _ in range(args.lookups):
+        location = f'City {rng.randrange(args.locations)}, GA'
+        term = ' '.join(rng.sample(TERMS, 2))
+        start = time.perf_counter()
+        index.lookup(location, term, yelp_client.POOL_PAGE_SIZE)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"index of {index.stats()['businesses']} businesses in {args.locations} locations")
+    print(f"lookup p50 {statistics.median(timings) * 1000:.3f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} ms")
+
+    groups = [[rng.choice(TERMS) for _ in range(args.group_size)] for _ in range(args.groups)]
+    for label, enabled in (('without index', None), ('with index', index)):
+        yelp_client.restaurant_index = enabled
+        before = stub_config.counts['search']
+        start = time.perf_counter()
+        for prefs in groups:
+            yelp_client.search_preferences(prefs, 'Atlanta, GA')
+        elapsed = time.perf_counter() - start
+        print(f"{label:>14}: {stub_config.counts['search'] - before:>5} upstream calls for "
+              f"{args.groups} searches, {elapsed / args.groups * 1000:.2f} ms per search")
+
+
+if __name__ == '__main__':
+    main()
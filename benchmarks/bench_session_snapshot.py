@@ -0,0 +1,131 @@
+"""
+Per-poll CPU of GET /api/session and memory per stored session.
+
+"rebuild" is the previous poll path: load a dict session (deepcopy from
+the memory store, JSON decode from SQLite) and encode its public fields
+on every poll. "snapshot" is the current one: look up the version and
+serve the bytes cached for it. Memory compares dict sessions with
+Session objects holding the same data, pool of fetched businesses
+included.
+
+    python benchmarks/bench_session_snapshot.py --polls 5000 --sessions 2000
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from candidate_pool import extend_pool, serve_next, start_pool
+from session_model import Session, SnapshotCache
+from session_store import MemorySessionStore, SQLiteSessionStore
+from voting import record_vote
+from yelp_client import slim_business
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def sample_session():
+    """A session mid-vote: 5 preferences, a 50 business pool, 6 candidates, 3 votes"""
+    with open(os.path.join(FIXTURES, 'businesses_search.json')) as f:
+        businesses = [slim_business(biz) for biz in json.load(f)['businesses'][:50]]
+    session = Session('host', 'Atlanta, GA', time.time() + 3600)
+    session.preferences = ['tacos', 'sushi', 'thai', 'something cheap', 'outdoor seating']
+    session.participants = ['host', 'ana', 'ben', 'cy', 'dee']
+    start_pool(session, 'bench', list(session.preferences))
+    extend_pool(session, {'businesses': businesses, 'next_offset': 50, 'exhausted': False})
+    serve_next(session)
+    session.status = 'voting'
+    for i in range(3):
+        record_vote(session, f'10.0.0.{i}-{time.time()}', session.candidates[i]['id'])
+    return session
+
+
+def rebuild_poll(get, session_id):
+    session = get(session_id)
+    return json.dumps({k: v for k, v in session.items() if k != 'candidate_pool'}).encode()
+
+
+def snapshot_poll(store, cache, session_id):
+    version = store.version(session_id)
+    snapshot = cache.get(session_id, version)
+    if snapshot is None:
+        snapshot = cache.put(session_id, store.get(session_id))
+    return snapshot.body
+
+
+def cpu_per_call(fn, polls):
+    start = time.process_time()
+    for _ in range(polls):
+        fn()
+    return (time.process_time() - start) / polls * 1e6
+
+
+def poll_costs(polls):
+    session = sample_session()
+    as_dict = json.loads(json.dumps(session.to_dict()))
+    # A miss happens once per version, so far less often than a hit
+    misses = max(1, polls // 10)
+    results = []
+
+    dicts = {'s1': as_dict}
+    memory = MemorySessionStore()
+    memory.create('s1', copy.deepcopy(session))
+    results.append((
+        'memory',
+        cpu_per_call(lambda: rebuild_poll(lambda sid: copy.deepcopy(dicts[sid]), 's1'), polls),
+        cpu_per_call(lambda: snapshot_poll(memory, SnapshotCache(), 's1'), misses),
+        cpu_per_call(lambda cache=SnapshotCache(): snapshot_poll(memory, cache, 's1'), polls)
+    ))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteSessionStore(os.path.join(tmp, 'sessions.db'))
+        sqlite.create('s1', session)
+        select = 'SELECT data FROM sessions WHERE id = ?'
+        results.append((
+            'sqlite',
+            cpu_per_call(lambda: rebuild_poll(
+                lambda sid: json.loads(sqlite._connect().execute(select, (sid,)).fetchone()[0]), 's1'
+            ), polls),
+            cpu_per_call(lambda: snapshot_poll(sqlite, SnapshotCache(), 's1'), misses),
+            cpu_per_call(lambda cache=SnapshotCache(): snapshot_poll(sqlite, cache, 's1'), polls)
+        ))
+    return results
+
+
+def bytes_per_session(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build() for _ in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del held
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--polls', type=int, default=5000)
+    parser.add_argument('--sessions', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'store':>8} {'rebuild us/poll':>16} {'snapshot miss us':>17} {'snapshot hit us':>16}")
+    for name, rebuild, miss, hit in poll_costs(args.polls):
+        print(f"{name:>8} {rebuild:>16.1f} {miss:>17.1f} {hit:>16.1f}")
+
+    print()
+    for label, session in (('empty', Session('host', 'Atlanta, GA', time.time())), ('mid-vote', sample_session())):
+        encoded = json.dumps(session.to_dict())
+        as_dict = bytes_per_session(lambda: json.loads(encoded), args.sessions)
+        as_object = bytes_per_session(lambda: Session.from_dict(json.loads(encoded)), args.sessions)
+        print(f"{label:>8} session: dict {as_dict:.0f} B, Session {as_object:.0f} B "
+              f"({(as_dict - as_object) / as_dict:.1%} less)")
+
+
+if __name__ == '__main__':
+    main()
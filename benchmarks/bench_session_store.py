@@ -0,0 +1,68 @@
+"""
+Session store throughput as worker processes go from 1 to N.
+
+Every worker runs the same read-modify-write cycle submit_preference does
+(append a preference under the session lock) against a shared SQLite store.
+The final preference count is checked so lost updates show up as failures.
+
+    python benchmarks/bench_session_store.py --max-workers 8 --ops 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from session_model import Session
+from session_store import SQLiteSessionStore
+
+NUM_SESSIONS = 16
+
+
+def worker(path, worker_id, ops):
+    store = SQLiteSessionStore(path)
+    for i in range(ops):
+        session_id = f's{i % NUM_SESSIONS}'
+        with store.update(session_id) as session:
+            session.preferences.append(f'{worker_id}-{i}')
+
+
+def run(workers, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.db')
+        store = SQLiteSessionStore(path)
+        for i in range(NUM_SESSIONS):
+            store.create(f's{i}', Session('bench', 'Atlanta, GA', time.time() + 3600))
+
+        procs = [
+            multiprocessing.Process(target=worker, args=(path, w, ops))
+            for w in range(workers)
+        ]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        total = sum(len(store.get(f's{i}').preferences) for i in range(NUM_SESSIONS))
+        return workers * ops / elapsed, total == workers * ops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--ops', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'ops/sec':>12} {'consistent':>11}")
+    for workers in range(1, args.max_workers + 1):
+        throughput, consistent = run(workers, args.ops)
+        print(f"{workers:>8} {throughput:>12.0f} {str(consistent):>11}")
+
+
+if __name__ == '__main__':
+    main()
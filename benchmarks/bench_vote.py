@@ -0,0 +1,70 @@
+"""
+Per-vote cost as the number of votes in a session grows.
+
+The session expects more votes than are cast so no winner is declared and
+every call goes through the full tally path. "route" is a whole
+POST /api/vote through the app and its memory session store,
+"record_vote" the tally helper alone, and "rebuild" the previous approach
+of re-counting every vote, for comparison.
+
+    python benchmarks/bench_vote.py --votes 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import app, sessions
+from session_model import Session
+from voting import record_vote, set_candidates
+
+
+def rebuild_tally(session, voter_id, candidate_id):
+    session.votes[voter_id] = candidate_id
+    vote_counts = {}
+    for cid in session.votes.values():
+        vote_counts[cid] = vote_counts.get(cid, 0) + 1
+    return vote_counts
+
+
+def new_session(num_candidates, expected_votes):
+    session = Session('bench', 'Atlanta, GA', time.time() + 3600)
+    session.participants = [f'p{i}' for i in range(expected_votes)]
+    session.participant_ids = list(session.participants)
+    session.status = 'voting'
+    set_candidates(session, [{'id': f'c{i}'} for i in range(num_candidates)])
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--votes', type=int, default=10000)
+    parser.add_argument('--candidates', type=int, default=6)
+    parser.add_argument('--checkpoints', type=int, default=5)
+    args = parser.parse_args()
+
+    step = args.votes // args.checkpoints
+    expected = args.votes * 3
+    client = app.test_client()
+    sessions.create('bench', new_session(args.candidates, expected))
+
+    def vote_route(session_id, voter_id, candidate_id):
+        response = client.post(f'/api/vote/{session_id}', json={'candidate_id': candidate_id, 'voter_id': voter_id})
+        assert response.status_code == 200, response.get_json()
+
+    print(f"{'votes':>8} {'route us':>9} {'record_vote us':>15} {'rebuild us':>11}")
+    incremental = new_session(args.candidates, expected)
+    rebuild = new_session(args.candidates, expected)
+    for checkpoint in range(1, args.checkpoints + 1):
+        timings = []
+        for fn, session in ((vote_route, 'bench'), (record_vote, incremental), (rebuild_tally, rebuild)):
+            start = time.perf_counter()
+            for i in range((checkpoint - 1) * step, checkpoint * step):
+                fn(session, f'voter-{i}', f'c{i % args.candidates}')
+            timings.append((time.perf_counter() - start) / step * 1e6)
+        print(f"{checkpoint * step:>8} {timings[0]:>9.2f} {timings[1]:>15.2f} {timings[2]:>11.2f}")
+
+if __name__ == '__main__':
+    main()
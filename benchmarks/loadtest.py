@@ -0,0 +1,383 @@
+"""
+End-to-end load test of the app against the offline Yelp stub.
+
+Simulates N concurrent sessions with M participants each. Every participant
+runs the full flow (create -> submit-preference -> poll -> start-voting ->
+vote -> poll until a winner) on its own thread and keep-alive connection.
+Actions go through POST /api/session/<id>/batch, whose response carries
+the new state, unless --api single uses the one-action endpoints.
+By default the stub runs in-process and the app is started under gunicorn
+with the SQLite session store; pass --base-url to target a server that is
+already running instead.
+
+Reports per-endpoint p50/p95/p99 latency, throughput, error rate, requests
+per completed decision and peak server RSS, and writes them as JSON with
+--output so runs can be diffed between releases.
+
+    python benchmarks/loadtest.py --sessions 50 --participants 5 --output before.json
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from yelp_stub import start_stub
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class Recorder:
+    """Thread-safe latency and outcome log keyed by endpoint name"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.decisions = 0
+        self.failed_sessions = 0
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Participant:
+    def __init__(self, base_url, recorder, args, index):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.args = args
+        self.index = index
+        self.http = requests.Session()
+        self.version = 0
+        self.state = None
+
+    def call(self, name, method, path, ok_statuses=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(name, time.perf_counter() - start, False)
+            raise
+        self.recorder.record(name, time.perf_counter() - start, response.status_code in ok_statuses)
+        return response
+
+    def session_state(self, session_id):
+        if self.args.poll_mode == 'long':
+            response = self.call(
+                'GET /api/session (long-poll)', 'GET',
+                f'/api/session/{session_id}?since={self.version}', ok_statuses=(200, 204)
+            )
+            if response.status_code == 204:
+                return None
+        else:
+            time.sleep(self.args.poll_interval)
+            response = self.call('GET /api/session', 'GET', f'/api/session/{session_id}')
+        response.raise_for_status()
+        self.state = response.json()
+        self.version = self.state.get('version', 0)
+        return self.state
+
+    def act(self, session_id, op, ok_statuses=(200,)):
+        """Send one participant action and keep the state it returns"""
+        if self.args.api == 'single':
+            self.call(f"POST /api/{op['op']}", 'POST', f"/api/{op['op']}/{session_id}",
+                      ok_statuses=ok_statuses, json=op)
+            return
+        response = self.call('POST /api/session/batch', 'POST', f'/api/session/{session_id}/batch',
+                             ok_statuses=ok_statuses, json={
+                                 'ops': [op], 'since': self.version if self.state else None
+                             })
+        if response.status_code == 200:
+            data = response.json()
+            self.state = data['session'] if 'session' in data else {**self.state, **data['changes']}
+            self.version = data['version']
+
+    def wait_for(self, session_id, predicate, deadline):
+        if self.state is not None and predicate(self.state):
+            return self.state
+        while time.time() < deadline:
+            state = self.session_state(session_id)
+            if state is not None and predicate(state):
+                return state
+        raise TimeoutError('session did not reach the expected state')
+
+    def run(self, session_ref, ready, deadline):
+        args = self.args
+        if self.index == 0:
+            response = self.call('POST /api/create', 'POST', '/api/create', json={
+                'host_name': 'host', 'location': 'Atlanta, GA'
+            })
+            session_ref['id'] = response.json()['session_id']
+            ready.set()
+        elif not ready.wait(max(0.0, deadline - time.time())):
+            raise TimeoutError('session was never created')
+        session_id = session_ref['id']
+
+        self.act(session_id, {
+            'op': 'submit-preference',
+            'preference': random.choice(args.preferences),
+            'participant_name': f'p{self.index}',
+            'voter_id': f'{session_id}-{self.index}'
+        })
+
+        if self.index == 0:
+            self.wait_for(session_id, lambda s: len(s['preferences']) >= args.participants, deadline)
+            self.call('POST /api/start-voting', 'POST', f'/api/start-voting/{session_id}', ok_statuses=(200, 202))
+
+        state = self.wait_for(session_id, lambda s: s['status'] in ('voting', 'completed'), deadline)
+        if state['status'] == 'voting':
+            candidate = random.choice(state['candidates'])
+            # 400 once the session has already been decided is expected
+            self.act(session_id, {
+                'op': 'vote', 'candidate_id': candidate['id'], 'voter_id': f'{session_id}-{self.index}'
+            }, ok_statuses=(200, 400))
+
+        self.wait_for(session_id, lambda s: s['status'] == 'completed', deadline)
+        if self.index == 0:
+            with self.recorder.lock:
+                self.recorder.decisions += 1
+
+
+def run_session(base_url, recorder, args):
+    session_ref = {}
+    ready = threading.Event()
+    deadline = time.time() + args.session_timeout
+    failed = []
+
+    def participant(index):
+        try:
+            Participant(base_url, recorder, args, index).run(session_ref, ready, deadline)
+        except Exception:
+            failed.append(index)
+            ready.set()
+
+    threads = [threading.Thread(target=participant, args=(i,)) for i in range(args.participants)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if failed:
+        with recorder.lock:
+            recorder.failed_sessions += 1
+
+
+def process_tree_rss_kb(pid):
+    """Resident memory of a process and all its descendants (Linux only)"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree = {pid}
+    changed = True
+    while changed:
+        children = {p for p, parent in parents.items() if parent in tree} - tree
+        tree |= children
+        changed = bool(children)
+    total = 0
+    for p in tree:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.last = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.last = process_tree_rss_kb(self.pid)
+            self.peak = max(self.peak, self.last)
+            self.stopped.wait(self.interval)
+
+
+def start_server(args, stub_port, workdir):
+    port = args.port
+    env = dict(
+        os.environ,
+        YELP_API_KEY='stub',
+        YELP_AI_ENDPOINT=f'http://127.0.0.1:{stub_port}/ai/chat/v2',
+        YELP_SEARCH_ENDPOINT=f'http://127.0.0.1:{stub_port}/v3/businesses/search',
+        SESSION_BACKEND='sqlite',
+        SESSION_DB_PATH=os.path.join(workdir, 'sessions.db'),
+        YELP_CACHE_PATH=os.path.join(workdir, 'cache.db'),
+        METRICS_DIR=os.path.join(workdir, 'metrics')
+    )
+    if args.no_cache:
+        env['YELP_CACHE_TTL'] = '0'
+        env['YELP_CACHE_STALE_TTL'] = '0'
+    command = ['gunicorn', '--bind', f'127.0.0.1:{port}'] + args.gunicorn_args.split() + ['app:app']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            if requests.get(base_url + '/api/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('server did not become healthy')
+
+
+def stop_server(process):
+    # Quick shutdown; SIGTERM would wait out any long-polls still held
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def build_report(recorder, duration, args, rss, stub_counts):
+    endpoints = {}
+    total_requests = 0
+    total_errors = 0
+    for name, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        total_requests += len(values)
+        total_errors += recorder.errors[name]
+        endpoints[name] = {
+            'count': len(values),
+            'errors': recorder.errors[name],
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2)
+        }
+    return {
+        'config': {
+            'sessions': args.sessions,
+            'participants': args.participants,
+            'poll_mode': args.poll_mode,
+            'api': args.api,
+            'gunicorn_args': None if args.base_url else args.gunicorn_args,
+            'stub_latency_ms': args.stub_latency_ms,
+            'stub_error_rate': args.stub_error_rate,
+            'stub_rate_limit_rate': args.stub_rate_limit_rate
+        },
+        'duration_s': round(duration, 3),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / duration, 2) if duration else 0.0,
+        'error_rate': round(total_errors / total_requests, 4) if total_requests else 0.0,
+        'decisions_completed': recorder.decisions,
+        'failed_sessions': recorder.failed_sessions,
+        'requests_per_decision': round(total_requests / recorder.decisions, 2) if recorder.decisions else None,
+        'server_rss_kb': rss,
+        'upstream_calls': stub_counts,
+        'endpoints': endpoints
+    }
+
+
+def print_report(report):
+    print(f"{'endpoint':<32} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:<32} {stats['count']:>7} {stats['errors']:>7} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    print(f"\n{report['requests']} requests in {report['duration_s']}s "
+          f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}")
+    print(f"{report['decisions_completed']} decisions completed, {report['failed_sessions']} failed, "
+          f"{report['requests_per_decision']} requests per decision")
+    if report['server_rss_kb']:
+        print(f"server RSS peak {report['server_rss_kb']['peak']} kB, end {report['server_rss_kb']['end']} kB")
+    if report['upstream_calls']:
+        print(f"upstream calls {report['upstream_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sessions', type=int, default=20, help='concurrent sessions')
+    parser.add_argument('--participants', type=int, default=4, help='participants per session, host included')
+    parser.add_argument('--poll-mode', choices=('long', 'interval'), default='long')
+    parser.add_argument('--api', choices=('batch', 'single'), default='batch',
+                        help='send actions through the batch endpoint or the one-action endpoints')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='seconds between polls in interval mode')
+    parser.add_argument('--session-timeout', type=float, default=120.0)
+    parser.add_argument('--preferences', nargs='+', default=['tacos', 'sushi', 'pizza', 'thai', 'bbq', 'vegan'])
+    parser.add_argument('--base-url', help='test a running server instead of starting one')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--gunicorn-args', default='--workers 2 --threads 4 --timeout 120')
+    parser.add_argument('--no-cache', action='store_true', help='disable the Yelp result cache')
+    parser.add_argument('--stub-latency-ms', type=float, default=300.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    stub_counts = None
+    process = None
+    sampler = None
+    workdir = tempfile.mkdtemp(prefix='pickit-loadtest-')
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+    else:
+        stub, stub_config = start_stub(
+            latency_ms=args.stub_latency_ms, jitter_ms=args.stub_latency_ms / 4,
+            error_rate=args.stub_error_rate, rate_limit_rate=args.stub_rate_limit_rate
+        )
+        stub_counts = stub_config.counts
+        process, base_url = start_server(args, stub.server_port, workdir)
+        sampler = RSSSampler(process.pid)
+        sampler.start()
+
+    recorder = Recorder()
+    try:
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_session, args=(base_url, recorder, args)) for _ in range(args.sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duration = time.perf_counter() - start
+    finally:
+        rss = None
+        if sampler:
+            sampler.stopped.set()
+            rss = {'peak': sampler.peak, 'end': sampler.last}
+        if process:
+            stop_server(process)
+
+    report = build_report(recorder, duration, args, rss, dict(stub_counts) if stub_counts else None)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
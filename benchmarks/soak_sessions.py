@@ -0,0 +1,63 @@
+"""
+Soak test for the session lifecycle.
+
+Creates sessions continuously through the Flask test client with a short
+timeout and grace period, and prints RSS next to the store's resident
+session count and bytes. With the reaper running, all three should level
+off once sessions start expiring instead of growing for the whole run.
+
+    python benchmarks/soak_sessions.py --duration 7200 --rate 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run')
+    parser.add_argument('--rate', type=float, default=200, help='sessions created per second')
+    parser.add_argument('--timeout', type=float, default=0.1, help='session timeout in minutes')
+    parser.add_argument('--report-every', type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_GRACE_SECONDS', '5')
+    os.environ.setdefault('SESSION_REAP_INTERVAL', '1')
+    from app import app, sessions
+
+    client = app.test_client()
+    start = time.time()
+    next_report = start
+    created = 0
+    print(f"{'elapsed':>8} {'created':>9} {'live':>7} {'bytes':>10} {'rss_kb':>9}")
+    while time.time() - start < args.duration:
+        response = client.post('/api/create', json={
+            'host_name': 'soak', 'location': 'Atlanta, GA', 'timeout': args.timeout
+        })
+        session_id = response.get_json()['session_id']
+        client.post(f'/api/submit-preference/{session_id}', json={
+            'preference': 'tacos under $20', 'participant_name': 'soak', 'voter_id': 'soak'
+        })
+        created += 1
+
+        now = time.time()
+        if now >= next_report:
+            stats = sessions.stats()
+            print(f"{now - start:>8.0f} {created:>9} {stats['sessions']:>7} {stats['bytes']:>10} {rss_kb():>9}")
+            next_report = now + args.report_every
+        time.sleep(max(0.0, start + created / args.rate - time.time()))
+
+
+if __name__ == '__main__':
+    main()
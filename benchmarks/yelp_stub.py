@@ -0,0 +1,172 @@
+"""
+Local stand-in for the Yelp AI chat and Fusion business search APIs.
+
+Serves the fixtures in benchmarks/fixtures with configurable latency,
+error rate and 429 rate, so the app can be exercised without network
+access or Yelp quota. Point the app at it with:
+
+    YELP_API_KEY=stub \
+    YELP_AI_ENDPOINT=http://127.0.0.1:8900/ai/chat/v2 \
+    YELP_SEARCH_ENDPOINT=http://127.0.0.1:8900/v3/businesses/search \
+    python app.py
+
+    python benchmarks/yelp_stub.py --port 8900 --latency-ms 300 --error-rate 0.02 --rate-limit-rate 0.01
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_businesses():
+    with open(os.path.join(FIXTURES, 'businesses_search.json')) as f:
+        return json.load(f)['businesses']
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.businesses = load_businesses()
+        self.counts = {'search': 0, 'ai': 0, 'errors': 0, 'rate_limited': 0}
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+def match(businesses, term):
+    """Businesses whose name or categories contain any word of the term"""
+    words = {w for w in re.findall(r'[a-z]+', term.lower()) if len(w) > 2}
+    if not words:
+        return businesses
+    matched = []
+    for biz in businesses:
+        text = ' '.join([biz['name']] + [c['title'] for c in biz['categories']]).lower()
+        if any(w in text for w in words):
+            matched.append(biz)
+    # Fall back to everything so load tests always reach the voting phase
+    return matched or businesses
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+    config: StubConfig = None
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate_upstream(self):
+        """Apply latency and injected failures; returns False if a failure was sent"""
+        config = self.config
+        delay = config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        roll = config.random.random()
+        if roll < config.rate_limit_rate:
+            config.count('rate_limited')
+            self._send_json(429, {'error': {'code': 'TOO_MANY_REQUESTS_PER_SECOND'}},
+                            {'Retry-After': str(config.retry_after)})
+            return False
+        if roll < config.rate_limit_rate + config.error_rate:
+            config.count('errors')
+            self._send_json(500, {'error': {'code': 'INTERNAL_ERROR'}})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/v3/businesses/search':
+            self._send_json(404, {'error': {'code': 'NOT_FOUND'}})
+            return
+        self.config.count('search')
+        if not self._simulate_upstream():
+            return
+        params = parse_qs(url.query)
+        limit = int(params.get('limit', ['20'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        businesses = match(self.config.businesses, params.get('term', [''])[0])
+        self._send_json(200, {
+            'businesses': businesses[offset:offset + limit],
+            'total': len(businesses),
+            'region': {'center': {'latitude': 33.75, 'longitude': -84.39}}
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if url.path != '/ai/chat/v2':
+            self._send_json(404, {'error': {'code': 'NOT_FOUND'}})
+            return
+        self.config.count('ai')
+        if not self._simulate_upstream():
+            return
+        businesses = match(self.config.businesses, body.get('query', ''))[:6]
+        self._send_json(200, {
+            'response': {'text': f"Here are {len(businesses)} places you might like."},
+            'entities': [{'businesses': businesses}],
+            'chat_id': 'stub-chat'
+        })
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(port=0, **options):
+    """Start the stub on a daemon thread; returns (server, config)"""
+    config = StubConfig(**options)
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='yelp-stub', daemon=True).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server, config = start_stub(
+        args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"Yelp stub listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(config.counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+from typing import Dict, List, Optional
+
+from session_model import Session
+from voting import set_candidates
+from yelp_client import format_candidates
+
+CANDIDATES_PER_ROUND = 6
+
+
+def start_pool(session: Session, pool_id: Optional[str], preferences: Optional[List[str]]) -> None:
+    """Forget any previous pool; pages for `preferences` are added by extend_pool"""
+    session.candidate_pool = []
+    session.pool_id = pool_id
+    session.pool_preferences = preferences
+    session.pool_cursor = 0
+    session.pool_offset = 0
+    session.pool_exhausted = False
+    session.pool_prefetching = False
+
+
+def clear_pool(session: Session) -> None:
+    start_pool(session, None, None)
+
+
+def extend_pool(session: Session, page: Dict) -> None:
+    """Append a page from search_preferences, skipping businesses already in the pool"""
+    pool = session.candidate_pool
+    seen = {biz['id'] for biz in pool}
+    pool.extend(biz for biz in page['businesses'] if biz['id'] not in seen)
+    session.pool_offset = page['next_offset']
+    session.pool_exhausted = page['exhausted']
+
+
+def has_next(session: Session, count: int = CANDIDATES_PER_ROUND) -> bool:
+    """
+    Whether at least `count` unseen businesses are pooled, or Yelp has
+    nothing more and serve_next can wrap around the pool
+    """
+    pool = session.candidate_pool
+    return len(pool) - session.pool_cursor >= count or (session.pool_exhausted and len(pool) > 0)
+
+
+def serve_next(session: Session, count: int = CANDIDATES_PER_ROUND) -> List[Dict]:
+    """
+    Show the next `count` unseen businesses from the pool, filling the
+    round from its start once Yelp has nothing more. Only this slice is
+    run through format_candidates.
+    """
+    pool = session.candidate_pool
+    cursor = min(session.pool_cursor, len(pool))
+    page = pool[cursor:cursor + count]
+    if session.pool_exhausted and len(page) < count:
+        cursor = min(count - len(page), cursor)
+        page = page + pool[:cursor]
+    else:
+        cursor += len(page)
+    candidates = format_candidates(page)
+    set_candidates(session, candidates)
+    session.pool_cursor = cursor
+    return candidates
+
+
+def claim_prefetch(session: Session, low_water: int) -> Optional[int]:
+    """
+    If fewer than `low_water` unseen businesses remain and Yelp may have
+    more, mark a prefetch as running and return the offset to fetch.
+    """
+    remaining = len(session.candidate_pool) - session.pool_cursor
+    if remaining >= low_water or session.pool_exhausted or session.pool_prefetching:
+        return None
+    session.pool_prefetching = True
+    return session.pool_offset
@@ -0,0 +1,52 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+GUNICORN_PROFILE picks how a worker serves concurrent requests:
+
+- gevent: each request is a greenlet, so a request waiting on Yelp, a
+  long-poll or SQLite's write lock costs a few kB instead of a thread.
+  Up to GUNICORN_WORKER_CONNECTIONS open connections per worker.
+- sync: GUNICORN_THREADS threads per worker; each Yelp call holds one of
+  them. A held long-poll would too, so long-poll is off by default and
+  clients poll every 2 seconds instead.
+"""
+import os
+
+profile = os.getenv('GUNICORN_PROFILE', 'gevent').lower()
+
+if profile == 'gevent':
+    # Patch before anything imports socket, ssl or threading: gunicorn's
+    # own patching in the worker comes after this file and the master
+    # have already imported them
+    from gevent import monkey
+    monkey.patch_all()
+
+    worker_class = 'gevent'
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+elif profile == 'sync':
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+    # Workers inherit this; GET /api/session?since= then answers at once
+    os.environ.setdefault('LONG_POLL_MAX_SECONDS', '0')
+else:
+    raise ValueError(f'Unknown GUNICORN_PROFILE {profile!r}, expected gevent or sync')
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+
+# The memory store is per process, so with several workers a session would
+# only exist in the one that created it. Workers inherit this environment.
+if workers > 1:
+    if os.environ.setdefault('SESSION_BACKEND', 'sqlite').lower() == 'memory':
+        raise ValueError('SESSION_BACKEND=memory cannot be shared between workers; use sqlite or GUNICORN_WORKERS=1')
+
+# A worker silent this long is restarted; searches run in the background,
+# so no request should come close
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+# On restart or deploy, let held long-polls (LONG_POLL_MAX_SECONDS) finish
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', float(os.getenv('LONG_POLL_MAX_SECONDS', 25)) + 5))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
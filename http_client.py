@@ -0,0 +1,92 @@
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _CappedRetry(Retry):
+    """Retry that honors Retry-After but never sleeps longer than `max_retry_after`"""
+
+    max_retry_after = 5.0
+
+    def new(self, **kw) -> '_CappedRetry':
+        # urllib3 builds each retry's successor from constructor arguments,
+        # which would drop an instance's max_retry_after
+        retry = super().new(**kw)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+class PooledHTTPClient:
+    """
+    Keep-alive HTTP client shared by every thread in the process.
+
+    One requests.Session is mounted with an HTTPAdapter whose urllib3 pool
+    keeps up to `pool_size` connections per host open, so calls after the
+    first skip the TCP and TLS handshakes. The pool and the session's cookie
+    jar do their own locking, and no per-call state is kept on the session,
+    so it is safe to use from threads and (once gevent has monkey-patched
+    the standard library) from greenlets.
+
+    Connection errors and 429/5xx responses are retried with jittered
+    exponential backoff; Retry-After is honored for 429 and 503. Read
+    timeouts are not retried so a slow upstream cannot stack timeouts.
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 retries: int = 2, backoff_factor: float = 0.3, backoff_jitter: float = 0.2,
+                 max_retry_after: float = 5.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        retry = _CappedRetry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        retry.max_retry_after = max_retry_after
+
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+    def request(self, method: str, url: str, read_timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', (self.connect_timeout, read_timeout or self.read_timeout))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Requests, new connections and reused connections per host"""
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = stats.setdefault(pool.host, {'requests': 0, 'connections': 0, 'reused': 0})
+            host['requests'] += pool.num_requests
+            host['connections'] += pool.num_connections
+            host['reused'] += max(0, pool.num_requests - pool.num_connections)
+        return stats
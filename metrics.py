@@ -0,0 +1,329 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, where gunicorn (and so METRICS_DIR) is not used
+    fcntl = None
+
+log = get_logger('metrics')
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+# Counters and histograms of workers that have exited, in a shared directory
+RETIRED_SNAPSHOT = 'retired.json'
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: 'MetricsRegistry' = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or default_registry).register(self)
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return [(labels, self._copy(value)) for labels, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonic count per label set, summed across workers"""
+
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Current value per label set. `mode` says how workers combine: 'sum'
+    (e.g. in-flight requests), 'max' (e.g. a breaker is open in any
+    worker) or 'live', which is read from the scraping worker only, for
+    values that already describe every worker such as the shared session
+    store.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), mode: str = 'sum',
+                 registry: 'MetricsRegistry' = None):
+        if mode not in ('sum', 'max', 'live'):
+            raise ValueError(f"Unknown gauge mode: {mode}")
+        self.mode = mode
+        super().__init__(name, help, labelnames, registry)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket latency distribution per label set, summed across workers"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = HTTP_BUCKETS, registry: 'MetricsRegistry' = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Counts are kept per bucket (not cumulative) plus +Inf, then the sum
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def _copy(self, value):
+        return list(value)
+
+
+class MetricsRegistry:
+    """
+    Metrics of one process, rendered in the Prometheus text format.
+
+    Under gunicorn every worker has its own registry. Once `share` is
+    called each worker writes a JSON snapshot of its registry to a common
+    directory every few seconds, and a scrape of any worker merges all the
+    snapshots, so /api/metrics describes the whole server whichever worker
+    answers it. When a worker has exited, the next scrape folds its
+    counters and histograms into a retired snapshot and deletes its file,
+    so a new worker reusing the PID cannot overwrite them; its gauges are
+    dropped.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.directory: Optional[str] = None
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def on_collect(self, callback: Callable[[], None]) -> None:
+        """Run `callback` before every snapshot and scrape, to refresh gauges"""
+        self._collectors.append(callback)
+
+    def collect(self) -> None:
+        for callback in self._collectors:
+            callback()
+
+    def snapshot(self) -> Dict:
+        return {
+            name: [[list(labels), value] for labels, value in metric.samples()]
+            for name, metric in self._metrics.items()
+            if not (metric.kind == 'gauge' and metric.mode == 'live')
+        }
+
+    def share(self, directory: str, interval: float) -> threading.Thread:
+        """Write this worker's snapshot to `directory` every `interval` seconds"""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # A snapshot under our PID was left by an exited worker that had it
+        with self._directory_lock():
+            self._retire([os.getpid()])
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except Exception:
+                    log.exception('metrics snapshot failed')
+
+        thread = threading.Thread(target=run, name='metrics-writer', daemon=True)
+        thread.start()
+        return thread
+
+    def write_snapshot(self) -> None:
+        self.collect()
+        self._write(f'{os.getpid()}.json', self.snapshot())
+
+    def _write(self, filename: str, snapshot: Dict) -> None:
+        path = os.path.join(self.directory, filename)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+
+    def _read(self, filename: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.directory, filename)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _directory_lock(self):
+        """
+        Held across workers while snapshots are read or retired, so a scrape
+        never sees a worker both in its own file and in the retired one
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, 'snapshots.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _retire(self, pids: List[int]) -> None:
+        """Fold the snapshots of exited workers into the retired snapshot and delete them"""
+        retired = self._read(RETIRED_SNAPSHOT) or {}
+        paths = []
+        for pid in pids:
+            filename = f'{pid}.json'
+            if not os.path.exists(os.path.join(self.directory, filename)):
+                continue
+            paths.append(os.path.join(self.directory, filename))
+            for name, samples in (self._read(filename) or {}).items():
+                metric = self._metrics.get(name)
+                if metric is None or metric.kind == 'gauge':
+                    continue
+                values = {tuple(labels): value for labels, value in retired.get(name, [])}
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    values[labels] = _combine(metric, values.get(labels), value)
+                retired[name] = [[list(labels), value] for labels, value in values.items()]
+        if not paths:
+            return
+        self._write(RETIRED_SNAPSHOT, retired)
+        for path in paths:
+            os.remove(path)
+
+    def _load_snapshots(self) -> List[Tuple[bool, Dict]]:
+        """
+        (alive, snapshot) for every running worker that has written one,
+        plus the retired snapshot of exited workers as not alive
+        """
+        with self._directory_lock():
+            snapshots = []
+            dead = []
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename == RETIRED_SNAPSHOT:
+                    continue
+                try:
+                    pid = int(filename[:-len('.json')])
+                except ValueError:
+                    continue
+                if not _pid_alive(pid):
+                    dead.append(pid)
+                    continue
+                snapshot = self._read(filename)
+                if snapshot is not None:
+                    snapshots.append((True, snapshot))
+            if dead:
+                self._retire(dead)
+            retired = self._read(RETIRED_SNAPSHOT)
+            if retired is not None:
+                snapshots.append((False, retired))
+        return snapshots
+
+    def merged(self) -> Dict[str, Dict[Tuple[str, ...], object]]:
+        """Samples per metric, combined across workers when shared"""
+        if self.directory is None:
+            self.collect()
+            return {name: dict(metric.samples()) for name, metric in self._metrics.items()}
+
+        self.write_snapshot()
+        merged = {name: {} for name in self._metrics}
+        for alive, snapshot in self._load_snapshots():
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                values = merged[name]
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    values[labels] = _combine(metric, values.get(labels), value)
+        for name, metric in self._metrics.items():
+            if metric.kind == 'gauge' and metric.mode == 'live':
+                merged[name] = dict(metric.samples())
+        return merged
+
+    def render(self) -> str:
+        lines = []
+        merged = self.merged()
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, value in sorted(merged[name].items()):
+                pairs = list(zip(metric.labelnames, labels))
+                if metric.kind != 'histogram':
+                    lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{name}_bucket{_labels(pairs + [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _combine(metric: _Metric, current, value):
+    if current is None:
+        return value
+    if metric.kind == 'histogram':
+        return [a + b for a, b in zip(current, value)]
+    if metric.kind == 'gauge' and metric.mode == 'max':
+        return max(current, value)
+    return current + value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+default_registry = MetricsRegistry()
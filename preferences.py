@@ -0,0 +1,117 @@
+import os
+import re
+from typing import Dict, List, Set, Tuple
+
+# Sub-queries sent to Yelp per search, and the size of each search term
+MAX_QUERIES = int(os.getenv('PREFERENCE_MAX_QUERIES', 3))
+MAX_TERM_WORDS = 5
+MAX_TERM_CHARS = 80
+
+# Words that only make a Yelp term longer and its results worse
+STOPWORDS = {
+    'a', 'an', 'and', 'any', 'anything', 'are', 'at', 'be', 'but', 'can', 'could', 'do', 'eat',
+    'eating', 'for', 'from', 'get', 'go', 'good', 'great', 'have', 'i', 'id', 'im', 'in', 'is',
+    'it', 'just', 'kind', 'like', 'maybe', 'me', 'my', 'near', 'nice', 'of', 'on', 'or', 'our',
+    'place', 'places', 'please', 'really', 'restaurant', 'restaurants', 'so', 'some', 'something',
+    'somewhere', 'sort', 'that', 'the', 'to', 'today', 'tonight', 'us', 'very', 'want', 'we',
+    'with', 'would', 'food'
+}
+
+
+class SubQuery:
+    """One bounded Yelp search term and the preferences (by index) it stands for"""
+
+    __slots__ = ('term', 'covers')
+
+    def __init__(self, term: str, covers: List[int]):
+        self.term = term
+        self.covers = covers
+
+    def __repr__(self) -> str:
+        return f'SubQuery({self.term!r}, {self.covers})'
+
+
+def _stem(word: str) -> str:
+    # Enough to match 'tacos' with 'Taco' or 'burgers' with 'Burgers'
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def preference_words(text: str) -> List[str]:
+    """Normalized words of a preference in order, without stopwords or repeats"""
+    words = []
+    for word in re.findall(r'[a-z0-9]+', text.lower().replace("'", '')):
+        if word not in STOPWORDS and word not in words:
+            words.append(word)
+    return words
+
+
+def preferences_key(preferences: List[str]) -> str:
+    """Order-independent key for a set of preferences; repeats count"""
+    return ','.join(sorted(' '.join(preference_words(p)) for p in preferences))
+
+
+def plan_queries(preferences: List[str], max_queries: int = MAX_QUERIES) -> List[SubQuery]:
+    """
+    Cluster preferences that share a word and turn the largest
+    `max_queries` clusters into short search terms. Preferences left out
+    of every sub-query still count when results are ranked.
+    """
+    clusters: List[Tuple[Set[str], Dict[str, int], List[int]]] = []
+    for index, preference in enumerate(preferences):
+        words = preference_words(preference)
+        if not words:
+            continue
+        stems = {_stem(w) for w in words}
+        cluster = next((c for c in clusters if c[0] & stems), None)
+        if cluster is None:
+            cluster = (set(), {}, [])
+            clusters.append(cluster)
+        cluster[0].update(stems)
+        for word in words:
+            cluster[1][word] = cluster[1].get(word, 0) + 1
+        cluster[2].append(index)
+
+    clusters.sort(key=lambda c: len(c[2]), reverse=True)
+    queries = []
+    for _, counts, covers in clusters[:max_queries]:
+        # Most shared words first; dict order breaks ties by first use
+        term = ''
+        for word in sorted(counts, key=counts.get, reverse=True)[:MAX_TERM_WORDS]:
+            if len(term) + len(word) + 1 > MAX_TERM_CHARS:
+                break
+            term = f'{term} {word}'.strip()
+        queries.append(SubQuery(term, covers))
+
+    if not queries:
+        queries.append(SubQuery('restaurants', list(range(len(preferences)))))
+    return queries
+
+
+def _business_stems(biz: Dict) -> Set[str]:
+    text = ' '.join([biz.get('name', '')] + [c.get('title', '') for c in biz.get('categories', [])])
+    return {_stem(w) for w in re.findall(r'[a-z0-9]+', text.lower())}
+
+
+def rank_businesses(preferences: List[str], pages: List[Tuple[SubQuery, List[Dict]]]) -> List[Dict]:
+    """
+    Merge the sub-query results, dedupe by business id and order by how
+    many preferences each business satisfies: those of every sub-query
+    that returned it, plus any whose words appear in its name or
+    categories. Ties keep Yelp's order, then rating.
+    """
+    preference_stems = [{_stem(w) for w in preference_words(p)} for p in preferences]
+    merged: Dict[str, list] = {}
+    for query, businesses in pages:
+        for position, biz in enumerate(businesses):
+            entry = merged.get(biz['id'])
+            if entry is None:
+                entry = merged[biz['id']] = [biz, set(), position]
+            entry[1].update(query.covers)
+            entry[2] = min(entry[2], position)
+
+    for biz, satisfied, _ in merged.values():
+        stems = _business_stems(biz)
+        satisfied.update(i for i, wanted in enumerate(preference_stems) if wanted & stems)
+
+    ranked = sorted(merged.values(), key=lambda e: (-len(e[1]), e[2], -(e[0].get('rating') or 0)))
+    return [biz for biz, _, _ in ranked]
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlite_pool import ConnectionPool
+
+
+class RestaurantIndex:
+    """
+    SQLite file of every business Yelp has returned, per location, with an
+    FTS5 index over name, categories and snippet.
+
+    Rows older than `max_age` are never served and are pruned as new pages
+    come in. `lookup` only answers for locations with at least
+    `min_businesses` fresh rows, and only when the term matches at least
+    `min_results` of them; otherwise the caller should ask Yelp, whose
+    results are then added here. Shared by every worker on the host.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, max_age: float, min_businesses: int, min_results: int):
+        self.path = path
+        self.max_age = max_age
+        self.min_businesses = min_businesses
+        self.min_results = min_results
+        self._pool = ConnectionPool(path)
+        self._adds = 0
+        self._lock = threading.Lock()
+        with self._pool.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS businesses ('
+                ' rowid INTEGER PRIMARY KEY,'
+                ' location TEXT NOT NULL,'
+                ' business_id TEXT NOT NULL,'
+                ' data TEXT NOT NULL,'
+                ' rating REAL NOT NULL,'
+                ' indexed_at REAL NOT NULL,'
+                ' UNIQUE (location, business_id)'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS businesses_location_age ON businesses (location, indexed_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS businesses_age ON businesses (indexed_at)')
+            # `place` holds one opaque token per location so the location filter
+            # runs inside the full-text match instead of after the join
+            conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS businesses_fts'
+                " USING fts5(place, name, categories, snippet, tokenize='porter unicode61')"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._pool.connection()
+
+    def add(self, location: str, businesses: List[Dict], snippet: Callable[[Dict], str]) -> None:
+        """Insert or refresh a page of (slimmed) businesses found for `location`"""
+        location = normalize_location(location)
+        place = location_token(location)
+        now = time.time()
+        with self._pool.transaction() as conn:
+            for biz in businesses:
+                row = conn.execute(
+                    'SELECT rowid FROM businesses WHERE location = ? AND business_id = ?',
+                    (location, biz['id'])
+                ).fetchone()
+                values = (json.dumps(biz), biz.get('rating') or 0, now)
+                if row is None:
+                    rowid = conn.execute(
+                        'INSERT INTO businesses (location, business_id, data, rating, indexed_at) VALUES (?, ?, ?, ?, ?)',
+                        (location, biz['id']) + values
+                    ).lastrowid
+                else:
+                    rowid = row[0]
+                    conn.execute('UPDATE businesses SET data = ?, rating = ?, indexed_at = ? WHERE rowid = ?',
+                                 values + (rowid,))
+                    conn.execute('DELETE FROM businesses_fts WHERE rowid = ?', (rowid,))
+                conn.execute(
+                    'INSERT INTO businesses_fts (rowid, place, name, categories, snippet) VALUES (?, ?, ?, ?, ?)',
+                    (rowid, place, biz.get('name', ''), ' '.join(c.get('title', '') for c in biz.get('categories', [])),
+                     snippet(biz))
+                )
+
+        with self._lock:
+            self._adds += 1
+            prune = self._adds % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune(now)
+
+    def lookup(self, location: str, term: str, limit: int, offset: int = 0) -> Optional[Tuple[List[Dict], float]]:
+        """
+        Fresh businesses in `location` matching any word of `term`, best
+        match first, with the oldest one's indexed_at; None when the index
+        cannot stand in for Yelp here.
+        """
+        words = fts_query(term)
+        if words is None:
+            return None
+        location = normalize_location(location)
+        fresh_after = time.time() - self.max_age
+        conn = self._connect()
+        count = conn.execute(
+            'SELECT COUNT(*) FROM businesses WHERE location = ? AND indexed_at >= ?', (location, fresh_after)
+        ).fetchone()[0]
+        if count < self.min_businesses:
+            return None
+
+        rows = conn.execute(
+            'SELECT b.data, b.indexed_at FROM businesses_fts f JOIN businesses b ON b.rowid = f.rowid'
+            ' WHERE businesses_fts MATCH ? AND b.indexed_at >= ?'
+            ' ORDER BY bm25(businesses_fts), b.rating DESC LIMIT ? OFFSET ?',
+            (f'place : "{location_token(location)}" AND ({words})', fresh_after, limit, offset)
+        ).fetchall()
+        if len(rows) < self.min_results:
+            return None
+        return [json.loads(data) for data, _ in rows], min(indexed_at for _, indexed_at in rows)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop rows too old to serve, returning how many were removed"""
+        cutoff = (time.time() if now is None else now) - self.max_age
+        with self._pool.transaction() as conn:
+            conn.execute(
+                'DELETE FROM businesses_fts WHERE rowid IN (SELECT rowid FROM businesses WHERE indexed_at < ?)',
+                (cutoff,)
+            )
+            removed = conn.execute('DELETE FROM businesses WHERE indexed_at < ?', (cutoff,)).rowcount
+        return removed
+
+    def stats(self) -> Dict:
+        businesses, locations = self._connect().execute(
+            'SELECT COUNT(*), COUNT(DISTINCT location) FROM businesses'
+        ).fetchone()
+        return {'businesses': businesses, 'locations': locations}
+
+
+def normalize_location(location: str) -> str:
+    return ' '.join(re.findall(r'[a-z0-9]+', location.lower()))
+
+
+def location_token(normalized_location: str) -> str:
+    return 'l' + hashlib.sha1(normalized_location.encode()).hexdigest()[:16]
+
+
+def fts_query(term: str) -> Optional[str]:
+    """FTS5 query matching any word of `term`; words are quoted so nothing is parsed as syntax"""
+    words = re.findall(r'[a-z0-9]+', term.lower())
+    if not words:
+        return None
+    return ' OR '.join(f'"{word}"' for word in dict.fromkeys(words))
@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlite_pool import ConnectionPool
+from structured_log import get_logger
+
+log = get_logger('result_cache')
+
+
+class DiskCacheBackend:
+    """
+    SQLite file shared by every worker on the host.
+
+    Used as a second tier behind the in-process LRU so a result fetched by
+    one worker is a hit in the others.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._pool = ConnectionPool(path)
+        with self._pool.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' value TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' stored_at REAL NOT NULL'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._pool.connection()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        row = self._connect().execute(
+            'SELECT value, stored_at FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, encoded: str, stored_at: float) -> int:
+        """Store an entry and return how many old entries were evicted"""
+        with self._pool.transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, stored_at) VALUES (?, ?, ?, ?)',
+                (key, encoded, len(encoded), stored_at)
+            )
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+            evicted = 0
+            while count > self.max_entries or size > self.max_bytes:
+                row = conn.execute('SELECT key, size FROM cache ORDER BY stored_at LIMIT 1').fetchone()
+                if row is None:
+                    break
+                conn.execute('DELETE FROM cache WHERE key = ?', (row[0],))
+                count, size = count - 1, size - row[1]
+                evicted += 1
+        return evicted
+
+
+class ResultCache:
+    """
+    TTL + LRU cache with stale-while-revalidate.
+
+    An entry younger than `ttl` is a plain hit. Up to `ttl + stale_ttl` it is
+    still served immediately, but a background refresh replaces it. Older
+    entries are misses. The in-process tier is bounded by both entry count
+    and encoded size in bytes.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int, max_bytes: int,
+                 disk: Optional[DiskCacheBackend] = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        self._entries: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'disk_evictions': 0,
+            'refreshes': 0, 'refresh_errors': 0
+        }
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0], entry[1]
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                value = json.loads(row[0])
+                self._store_local(key, value, row[1], len(row[0]))
+                return value, row[1]
+        return None
+
+    def _store_local(self, key: str, value: Any, stored_at: float, size: int) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, stored_at, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters['evictions'] += 1
+
+    def put(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value)
+        stored_at = time.time()
+        self._store_local(key, value, stored_at, len(encoded))
+        if self.disk is not None:
+            evicted = self.disk.put(key, encoded, stored_at)
+            if evicted:
+                self._count('disk_evictions', evicted)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any]) -> None:
+        try:
+            value = fetch()
+            if value:
+                self.put(key, value)
+            self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            log.warning('cache refresh failed', extra={'key': key, 'error': str(e)})
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, calling `fetch` on a miss"""
+        entry = self._lookup(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                self._count('hits')
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._count('stale_hits')
+                with self._lock:
+                    start_refresh = key not in self._refreshing
+                    self._refreshing.add(key)
+                if start_refresh:
+                    threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+                return value
+
+        self._count('misses')
+        value = fetch()
+        # Empty results are not cached so a new business shows up right away
+        if value:
+            self.put(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._bytes)
@@ -0,0 +1,102 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from structured_log import get_logger
+
+log = get_logger('search_jobs')
+
+
+class QueueFullError(Exception):
+    """Raised when too many distinct searches are already queued or running"""
+
+
+class _Job:
+    def __init__(self, future: Future):
+        self.future = future
+        self.owners: Dict[str, Callable] = {}
+
+
+class SearchJobQueue:
+    """
+    Bounded worker pool for upstream searches with request coalescing.
+
+    Submissions with the same key while a job for it is queued or running
+    share that job (singleflight), so a double-clicked start-voting or two
+    sessions asking for the same query cost one upstream call. Each owner
+    (a session id) gets its own completion callback; `cancel` drops an
+    owner's callback and cancels the job if nobody else is waiting on it
+    and it has not started yet. At most `max_pending` distinct jobs may be
+    outstanding; beyond that `submit` sheds load with QueueFullError.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search-job')
+        self._jobs: Dict[str, _Job] = {}
+        self._owner_keys: Dict[str, str] = {}
+        # Reentrant: cancelling a queued future runs _finish synchronously
+        self._lock = threading.RLock()
+
+    def submit(self, owner: str, key: str, fetch: Callable[[], Any],
+               on_done: Callable[[Optional[Any], Optional[Exception]], None]) -> bool:
+        """
+        Run `fetch` for `key` unless a job for it is already outstanding,
+        then call `on_done(result, error)` for this owner. Returns True if
+        the search was coalesced into an existing job.
+        """
+        with self._lock:
+            self._detach(owner)
+            job = self._jobs.get(key)
+            coalesced = job is not None
+            if job is None:
+                if len(self._jobs) >= self.max_pending:
+                    raise QueueFullError('Too many searches in progress')
+                job = _Job(self._pool.submit(fetch))
+                self._jobs[key] = job
+            job.owners[owner] = on_done
+            self._owner_keys[owner] = key
+        if not coalesced:
+            # Registered after this owner, so a job that already finished
+            # runs _finish right here and sees it; and outside the lock,
+            # since the callbacks take session locks of their own
+            job.future.add_done_callback(lambda future: self._finish(key, job))
+        return coalesced
+
+    def cancel(self, owner: str) -> None:
+        """Forget `owner`'s pending search; its callback will not run"""
+        with self._lock:
+            self._detach(owner)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def _detach(self, owner: str) -> None:
+        # Caller holds self._lock
+        key = self._owner_keys.pop(owner, None)
+        job = self._jobs.get(key) if key is not None else None
+        if job is None:
+            return
+        job.owners.pop(owner, None)
+        if not job.owners:
+            job.future.cancel()
+
+    def _finish(self, key: str, job: _Job) -> None:
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+            owners = list(job.owners.items())
+            for owner, _ in owners:
+                if self._owner_keys.get(owner) == key:
+                    del self._owner_keys[owner]
+        if job.future.cancelled():
+            return
+
+        error = job.future.exception()
+        result = None if error is not None else job.future.result()
+        for owner, on_done in owners:
+            try:
+                on_done(result, error)
+            except Exception:
+                log.exception('search job callback failed', extra={'owner': owner})
@@ -0,0 +1,195 @@
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class Session:
+    """
+    One voting session.
+
+    Fields are fixed by __slots__, which keeps a session smaller than the
+    equivalent dict and puts every field and its type in one place.
+    Timestamps are epoch seconds. `version` goes up with every change a
+    client can see (see bump_version); it drives long-polling and the
+    cached public snapshot.
+    """
+
+    __slots__ = (
+        'creator', 'location', 'preferences', 'participants', 'participant_ids',
+        'candidates', 'votes', 'vote_counts', 'candidate_index',
+        'status', 'started', 'winner', 'tie_breaker', 'error', 'error_message',
+        'search_id', 'search_from', 'search_started_at',
+        'created_at', 'expires_at', 'completed_at', 'version',
+        'candidate_pool', 'pool_id', 'pool_preferences', 'pool_cursor', 'pool_offset',
+        'pool_exhausted', 'pool_prefetching'
+    )
+
+    creator: str
+    location: str
+    preferences: List[str]
+    # Display names, one per participant_ids entry; names may repeat
+    participants: List[str]
+    # Voter ids of everyone who submitted a preference, server-side only
+    participant_ids: List[str]
+    candidates: List[Dict]
+    # voter id -> candidate id; clients only ever see vote_counts
+    votes: Dict[str, str]
+    vote_counts: Dict[str, int]
+    candidate_index: Dict[str, int]
+    status: str
+    started: bool
+    winner: Optional[Dict]
+    tie_breaker: bool
+    error: Optional[str]
+    error_message: Optional[str]
+    search_id: Optional[str]
+    search_from: Optional[str]
+    search_started_at: Optional[float]
+    created_at: float
+    expires_at: float
+    completed_at: Optional[float]
+    version: int
+    candidate_pool: List[Dict]
+    pool_id: Optional[str]
+    pool_preferences: Optional[List[str]]
+    pool_cursor: int
+    pool_offset: int
+    pool_exhausted: bool
+    pool_prefetching: bool
+
+    # Sent to clients by GET /api/session; the rest stays server-side
+    PUBLIC_FIELDS = (
+        'creator', 'location', 'preferences', 'participants', 'candidates', 'vote_counts',
+        'status', 'started', 'winner', 'tie_breaker', 'error', 'error_message',
+        'created_at', 'expires_at', 'completed_at', 'version'
+    )
+
+    def __init__(self, creator: str, location: str, expires_at: float, created_at: Optional[float] = None):
+        self.creator = creator
+        self.location = location
+        self.preferences = []
+        self.participants = []
+        self.participant_ids = []
+        self.candidates = []
+        self.votes = {}
+        self.vote_counts = {}
+        self.candidate_index = {}
+        self.status = 'collecting'
+        self.started = False
+        self.winner = None
+        self.tie_breaker = False
+        self.error = None
+        self.error_message = None
+        self.search_id = None
+        self.search_from = None
+        self.search_started_at = None
+        self.created_at = time.time() if created_at is None else created_at
+        self.expires_at = expires_at
+        self.completed_at = None
+        self.version = 1
+        self.candidate_pool = []
+        self.pool_id = None
+        self.pool_preferences = None
+        self.pool_cursor = 0
+        self.pool_offset = 0
+        self.pool_exhausted = False
+        self.pool_prefetching = False
+
+    def bump_version(self) -> None:
+        """Mark the session as changed so long-polling clients pick it up"""
+        self.version += 1
+
+    def to_dict(self) -> Dict:
+        """Every field, for storage"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Session':
+        session = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(session, name, data[name])
+        return session
+
+    def public_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.PUBLIC_FIELDS}
+
+    def checkpoint(self) -> 'Session':
+        """A copy to restore() from; pooled businesses are shared since nothing modifies them"""
+        data = self.to_dict()
+        pool = data.pop('candidate_pool')
+        data = copy.deepcopy(data)
+        data['candidate_pool'] = list(pool)
+        return Session.from_dict(data)
+
+    def restore(self, checkpoint: 'Session') -> None:
+        """Put every field back as it was in `checkpoint`, keeping this object"""
+        for name in self.__slots__:
+            setattr(self, name, getattr(checkpoint, name))
+
+
+class Snapshot:
+    """
+    A session's public state encoded once, with what GET needs to answer
+    without decoding it. `digests` has one hash per public field, so two
+    snapshots can tell which fields differ (see changed_fields).
+    """
+
+    __slots__ = ('version', 'status', 'expires_at', 'body', 'etag', 'digests')
+
+    def __init__(self, session: Session):
+        self.version = session.version
+        self.status = session.status
+        self.expires_at = session.expires_at
+        fields = [json.dumps(getattr(session, name), separators=(',', ':')) for name in Session.PUBLIC_FIELDS]
+        self.body = ('{' + ','.join(
+            f'"{name}":{value}' for name, value in zip(Session.PUBLIC_FIELDS, fields)
+        ) + '}').encode()
+        self.etag = f'v{session.version}'
+        self.digests = tuple(hash(value) for value in fields)
+
+    def changed_fields(self, older: 'Snapshot') -> List[str]:
+        """Public fields whose value differs from `older`"""
+        return [name for name, new, old in zip(Session.PUBLIC_FIELDS, self.digests, older.digests) if new != old]
+
+
+class SnapshotCache:
+    """
+    Encoded public state per session, reused until the version moves.
+
+    Polls of an unchanged session are served from here, so they cost a
+    version lookup instead of loading, copying and re-encoding the whole
+    session. Entries for other versions are simply replaced; the least
+    recently used sessions are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Snapshot]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, version: int) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._entries.get(session_id)
+            if snapshot is None or snapshot.version != version:
+                return None
+            self._entries.move_to_end(session_id)
+            return snapshot
+
+    def put(self, session_id: str, session: Session) -> Snapshot:
+        snapshot = Snapshot(session)
+        with self._lock:
+            current = self._entries.get(session_id)
+            # A slower request must not replace a newer snapshot
+            if current is not None and current.version > snapshot.version:
+                return snapshot
+            self._entries[session_id] = snapshot
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self._entries)
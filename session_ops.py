@@ -0,0 +1,122 @@
+import time
+from typing import Callable, Dict
+
+from session_model import Session
+from voting import find_candidate, record_vote
+
+MAX_PREFERENCE_CHARS = 500
+
+
+class ActionError(Exception):
+    """A participant action the session refuses; nothing was changed"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# Each action validates everything before it changes the session and
+# returns the response body of its single-action endpoint. Callers hold
+# the session lock and bump the version.
+
+def _voter_id(data: Dict) -> str:
+    """
+    The browser's stable id, which is who a participant is: display names
+    may repeat, and a vote without an id could not be told from a retry
+    """
+    voter_id = data.get('voter_id')
+    if not isinstance(voter_id, str) or not voter_id.strip():
+        raise ActionError('Missing voter_id')
+    return voter_id.strip()
+
+
+def submit_preference(session: Session, data: Dict) -> Dict:
+    if session.status != 'collecting':
+        raise ActionError('This session is no longer accepting preferences.')
+
+    preference = data.get('preference', '')
+    preference = preference.strip() if isinstance(preference, str) else ''
+    participant_name = data.get('participant_name', 'Anonymous')
+
+    if not preference:
+        raise ActionError('Please enter a preference')
+
+    if len(preference) > MAX_PREFERENCE_CHARS:
+        raise ActionError(f'Preference is too long (max {MAX_PREFERENCE_CHARS} characters)')
+
+    voter_id = _voter_id(data)
+
+    session.preferences.append(preference)
+
+    if voter_id not in session.participant_ids:
+        session.participant_ids.append(voter_id)
+        session.participants.append(participant_name)
+
+    return {
+        'message': 'Preference submitted',
+        'total_submitted': len(session.preferences),
+        'participant_count': len(session.participants)
+    }
+
+
+def remove_preference(session: Session, data: Dict) -> Dict:
+    if session.status != 'collecting':
+        raise ActionError('Cannot remove preferences after voting started')
+
+    index = data.get('index')
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(session.preferences):
+        raise ActionError('Invalid preference index')
+
+    removed = session.preferences.pop(index)
+    return {
+        'message': 'Preference removed',
+        'removed': removed,
+        'total_remaining': len(session.preferences)
+    }
+
+
+def vote(session: Session, data: Dict) -> Dict:
+    if session.status != 'voting':
+        raise ActionError('Voting is not currently active')
+
+    candidate_id = data.get('candidate_id')
+
+    if not candidate_id:
+        raise ActionError('No candidate selected')
+
+    if find_candidate(session, candidate_id) is None:
+        raise ActionError('Invalid candidate selected')
+
+    # A re-vote moves the voter's existing vote instead of adding one
+    voter_id = _voter_id(data)
+
+    result = record_vote(session, voter_id, candidate_id)
+
+    if result['winner_id'] is not None:
+        winner = find_candidate(session, result['winner_id'])
+        session.winner = winner
+        session.status = 'completed'
+        session.completed_at = time.time()
+        session.tie_breaker = result['tie_breaker']
+
+        return {
+            'winner': winner,
+            'total_votes': result['total_votes'],
+            'winning_votes': result['winning_votes'],
+            'tie_breaker': result['tie_breaker']
+        }
+
+    return {
+        'total_votes': result['total_votes'],
+        'expected_votes': result['expected_votes'],
+        'winner': None
+    }
+
+
+# Accepted in a batch's "op" field
+ACTIONS: Dict[str, Callable[[Session, Dict], Dict]] = {
+    'submit-preference': submit_preference,
+    'remove-preference': remove_preference,
+    'vote': vote
+}
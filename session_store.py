@@ -0,0 +1,350 @@
+import copy
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from session_model import Session
+from sqlite_pool import ConnectionPool
+from structured_log import get_logger
+
+log = get_logger('session_store')
+
+DEFAULT_GRACE_SECONDS = 300
+DEFAULT_MAX_SESSIONS = 10000
+
+
+def eviction_deadline(session: Session, grace: float) -> float:
+    """Time after which a session can be dropped from the store"""
+    if session.status == 'completed' and session.completed_at:
+        return min(session.completed_at, session.expires_at) + grace
+    return session.expires_at + grace
+
+
+class SessionStore:
+    """
+    Storage interface every route in app.py goes through.
+
+    `update` is the only way to change a session: it yields the session
+    (or None if it does not exist) with an exclusive per-session lock held,
+    and writes it back when the block exits without raising. What happens
+    to changes made before an exception depends on the backend (SQLite
+    discards them, memory keeps them), so callers validate everything
+    before they change the session, as session_ops does, and take a
+    Session.checkpoint() when a later step may still fail.
+
+    Sessions are evicted by `reap` once `eviction_deadline` has passed, and
+    the least recently written ones are dropped when `max_sessions` is hit.
+    """
+
+    def __init__(self, grace: float = DEFAULT_GRACE_SECONDS, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.grace = grace
+        self.max_sessions = max_sessions
+
+    def create(self, session_id: str, session: Session) -> bool:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> Optional[int]:
+        """Current version without loading the session, or None if it does not exist"""
+        raise NotImplementedError
+
+    def update(self, session_id: str):
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Evict sessions past their deadline, returning how many were dropped"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """Resident session count and approximate serialized size in bytes"""
+        raise NotImplementedError
+
+    def wait(self, session_id: str, since: int, timeout: float) -> Optional[int]:
+        """
+        Block until the session's version is greater than `since` or
+        `timeout` seconds pass. Returns the current version, or None if the
+        session does not exist.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process store, only correct with a single worker process.
+
+    Deadlines live in a min-heap of (deadline, session_id). Entries are not
+    removed when a deadline moves; `reap` skips the ones that no longer
+    match `_deadlines`, so each update costs O(log n) at most.
+
+    Each session has its own Condition: `update` holds it and wakes
+    long-poll waiters when the session's version moves. `update` yields
+    the stored object itself rather than a copy, so copying does not make
+    every write cost O(session size); a block that raises midway leaves
+    its changes in place.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._conditions: Dict[str, threading.Condition] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        # Sessions written since stats() last measured them
+        self._unsized: Set[str] = set()
+        self._heap = []
+        self._guard = threading.Lock()
+
+    def _track(self, session_id: str, session: Session) -> None:
+        # Caller holds self._guard
+        deadline = eviction_deadline(session, self.grace)
+        if self._deadlines.get(session_id) != deadline:
+            self._deadlines[session_id] = deadline
+            heapq.heappush(self._heap, (deadline, session_id))
+        self._unsized.add(session_id)
+        self._sessions.move_to_end(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        # Caller holds self._guard
+        self._sessions.pop(session_id, None)
+        self._conditions.pop(session_id, None)
+        self._deadlines.pop(session_id, None)
+        self._sizes.pop(session_id, None)
+        self._unsized.discard(session_id)
+
+    def create(self, session_id: str, session: Session) -> bool:
+        with self._guard:
+            if session_id in self._sessions:
+                return False
+            while len(self._sessions) >= self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+            self._sessions[session_id] = session
+            self._conditions[session_id] = threading.Condition()
+            self._track(session_id, session)
+            return True
+
+    def get(self, session_id: str) -> Optional[Session]:
+        condition = self._conditions.get(session_id)
+        if condition is None:
+            return None
+        with condition:
+            session = self._sessions.get(session_id)
+            return copy.deepcopy(session) if session is not None else None
+
+    def version(self, session_id: str) -> Optional[int]:
+        session = self._sessions.get(session_id)
+        return session.version if session is not None else None
+
+    @contextmanager
+    def update(self, session_id: str) -> Iterator[Optional[Session]]:
+        condition = self._conditions.get(session_id)
+        if condition is None:
+            yield None
+            return
+        with condition:
+            session = self._sessions.get(session_id)
+            version = session.version if session is not None else None
+            yield session
+            if session is not None:
+                with self._guard:
+                    if session_id in self._sessions:
+                        self._track(session_id, session)
+                if session.version != version:
+                    condition.notify_all()
+
+    def wait(self, session_id: str, since: int, timeout: float) -> Optional[int]:
+        condition = self._conditions.get(session_id)
+        if condition is None:
+            return None
+        with condition:
+            condition.wait_for(lambda: (self.version(session_id) or since + 1) > since, timeout)
+            return self.version(session_id)
+
+    def delete(self, session_id: str) -> None:
+        with self._guard:
+            self._drop(session_id)
+
+    def reap(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        evicted = 0
+        with self._guard:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, session_id = heapq.heappop(self._heap)
+                if self._deadlines.get(session_id) == deadline:
+                    self._drop(session_id)
+                    evicted += 1
+        return evicted
+
+    def stats(self) -> Dict:
+        # Sizes are measured here rather than on every write, so a write
+        # costs the same however large the session has grown; only the
+        # sessions written since the last call are encoded again
+        with self._guard:
+            unsized, self._unsized = self._unsized, set()
+        for session_id in unsized:
+            condition = self._conditions.get(session_id)
+            if condition is None:
+                continue
+            with condition:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                size = len(json.dumps(session.to_dict(), default=str))
+            with self._guard:
+                if session_id in self._sessions:
+                    self._sizes[session_id] = size
+        with self._guard:
+            return {'sessions': len(self._sessions), 'bytes': sum(self._sizes.values())}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store shared by every worker on the host through a WAL-mode SQLite file.
+
+    Sessions are kept as JSON documents. `update` runs inside a
+    BEGIN IMMEDIATE transaction so concurrent read-modify-write cycles from
+    different workers serialize instead of overwriting each other.
+    Eviction deadlines and last-write times are indexed columns so `reap`
+    and the LRU cap are single range deletes. The version is a column too,
+    so long-poll waiters in any worker can check it without parsing JSON.
+    """
+
+    WAIT_INTERVAL = 0.2
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._pool = ConnectionPool(path, busy_timeout)
+        with self._pool.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' id TEXT PRIMARY KEY,'
+                ' data TEXT NOT NULL,'
+                ' version INTEGER NOT NULL DEFAULT 0,'
+                ' evict_at REAL NOT NULL,'
+                ' touched_at REAL NOT NULL'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_evict_at ON sessions (evict_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS sessions_touched_at ON sessions (touched_at)')
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._pool.connection()
+
+    def create(self, session_id: str, session: Session) -> bool:
+        with self._pool.transaction() as conn:
+            overflow = len(self) - self.max_sessions + 1
+            if overflow > 0:
+                conn.execute(
+                    'DELETE FROM sessions WHERE id IN ('
+                    ' SELECT id FROM sessions ORDER BY touched_at LIMIT ?'
+                    ')',
+                    (overflow,)
+                )
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO sessions (id, data, version, evict_at, touched_at) VALUES (?, ?, ?, ?, ?)',
+                (session_id, json.dumps(session.to_dict()), session.version,
+                 eviction_deadline(session, self.grace), time.time())
+            )
+        return cursor.rowcount == 1
+
+    def get(self, session_id: str) -> Optional[Session]:
+        row = self._connect().execute(
+            'SELECT data FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        return Session.from_dict(json.loads(row[0])) if row else None
+
+    def version(self, session_id: str) -> Optional[int]:
+        row = self._connect().execute(
+            'SELECT version FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    @contextmanager
+    def update(self, session_id: str) -> Iterator[Optional[Session]]:
+        with self._pool.transaction() as conn:
+            row = conn.execute(
+                'SELECT data FROM sessions WHERE id = ?', (session_id,)
+            ).fetchone()
+            session = Session.from_dict(json.loads(row[0])) if row else None
+            yield session
+            if session is not None:
+                conn.execute(
+                    'UPDATE sessions SET data = ?, version = ?, evict_at = ?, touched_at = ? WHERE id = ?',
+                    (json.dumps(session.to_dict()), session.version,
+                     eviction_deadline(session, self.grace), time.time(), session_id)
+                )
+
+    def delete(self, session_id: str) -> None:
+        with self._pool.transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def reap(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._pool.transaction() as conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE evict_at <= ?', (now,))
+        return cursor.rowcount
+
+    def wait(self, session_id: str, since: int, timeout: float) -> Optional[int]:
+        conn = self._connect()
+        deadline = time.monotonic() + timeout
+        while True:
+            row = conn.execute('SELECT version FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            if row is None or row[0] > since or time.monotonic() >= deadline:
+                return row[0] if row else None
+            time.sleep(min(self.WAIT_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+    def stats(self) -> Dict:
+        count, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions'
+        ).fetchone()
+        return {'sessions': count, 'bytes': size}
+
+    def __len__(self) -> int:
+        return self._connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+def start_reaper(store: SessionStore, interval: float) -> threading.Thread:
+    """Run `store.reap` every `interval` seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.reap()
+            except Exception:
+                log.exception('session reaper failed')
+
+    thread = threading.Thread(target=run, name='session-reaper', daemon=True)
+    thread.start()
+    return thread
+
+
+def create_store() -> SessionStore:
+    """Build the backend selected by SESSION_BACKEND (memory or sqlite)"""
+    backend = os.getenv('SESSION_BACKEND', 'memory').lower()
+    options = {
+        'grace': float(os.getenv('SESSION_GRACE_SECONDS', DEFAULT_GRACE_SECONDS)),
+        'max_sessions': int(os.getenv('SESSION_MAX_LIVE', DEFAULT_MAX_SESSIONS))
+    }
+    if backend == 'memory':
+        return MemorySessionStore(**options)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.getenv('SESSION_DB_PATH', 'pickit-sessions.db'), **options)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
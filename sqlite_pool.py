@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# One write lock per database file in this process, shared by every pool
+# on that file
+_write_locks: Dict[str, threading.RLock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def write_lock(path: str) -> threading.RLock:
+    """
+    The lock this process's writers to `path` queue on. Waiting here yields
+    to other greenlets under gevent; SQLite's busy handler sleeps without
+    yielding, so writers should only meet it across processes.
+    """
+    key = os.path.abspath(path)
+    with _write_locks_guard:
+        lock = _write_locks.get(key)
+        if lock is None:
+            lock = _write_locks[key] = threading.RLock()
+        return lock
+
+
+class _Lease:
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """
+    One SQLite connection (WAL, autocommit) per running thread.
+
+    A connection belongs to the thread that first asks for it and goes
+    back to the pool when that thread ends. Under gevent every request
+    runs on a fresh greenlet, which threading.local treats as a thread;
+    without the pool each request would open its own connection.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, max_idle: int = 16):
+        self.path = path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.write_lock = write_lock(path)
+        self._local = threading.local()
+        # list.append and list.pop are atomic, and the release callback may
+        # run from garbage collection, so no lock here
+        self._idle: List[sqlite3.Connection] = []
+
+    def connection(self) -> sqlite3.Connection:
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            try:
+                conn = self._idle.pop()
+            except IndexError:
+                conn = self._open()
+            lease = self._local.lease = _Lease(conn)
+            weakref.finalize(lease, self._release, conn)
+        return lease.conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        This thread's connection inside BEGIN IMMEDIATE, holding the file's
+        write lock; commits on exit and rolls back on an exception. Every
+        write goes through here.
+        """
+        conn = self.connection()
+        with self.write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if len(self._idle) < self.max_idle:
+            self._idle.append(conn)
+        else:
+            conn.close()
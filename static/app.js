@@ -1,5 +1,21 @@
 let sessionId = null;
 let pollInterval = null;
+let pollLoop = null;
+let sessionVersion = 0;
+let currentSession = null;
+let shownError = null;
+
+// Stable per-browser voter id so voting again moves our vote instead of adding one
+const voterId = (() => {
+    let id = localStorage.getItem('pickit-voter-id');
+    if (!id) {
+        id = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem('pickit-voter-id', id);
+    }
+    return id;
+})();
 let isHost = false;
 let isOnline = true;
 
@@ -87,7 +103,6 @@ let lastAction = null;
 // Monitor connection
 window.addEventListener('online', () => checkConnection());
 window.addEventListener('offline', () => checkConnection());
-setInterval(checkConnection, 5000);
 
 // Confetti effect
 function createConfetti() {
@@ -229,20 +244,12 @@ async function submitPreference() {
                                document.getElementById('host-name')?.value || 
                                'Anonymous';
         
-        const response = await fetch(`/api/submit-preference/${sessionId}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ 
-                preference,
-                participant_name: participantName
-            })
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to submit preference');
-        }
+        await sendActions([{
+            op: 'submit-preference',
+            preference,
+            participant_name: participantName,
+            voter_id: voterId
+        }], 'Failed to submit preference');
         
         // Clear input
         document.getElementById('preference-input').value = '';
@@ -267,17 +274,7 @@ async function removePreference(index) {
     if (!confirm('Remove this preference?')) return;
     
     try {
-        const response = await fetch(`/api/remove-preference/${sessionId}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ index })
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to remove preference');
-        }
+        await sendActions([{ op: 'remove-preference', index }], 'Failed to remove preference');
     } catch (error) {
         alert(`Error: ${error.message}`);
     }
@@ -307,6 +304,8 @@ async function resetSession() {
 // Start voting
 async function startVoting() {
     lastAction = 'startVoting';
+    // The same error again after this retry is a new failure
+    shownError = null;
     
     try {
         hideAllSections();
@@ -318,6 +317,8 @@ async function startVoting() {
         
         const data = await response.json();
         
+        // 202: the search runs in the background and the session moves to
+        // 'searching'; updateUI picks up the result or error from there
         if (!response.ok) {
             if (data.error_type === 'no_results') {
                 showError(data.error, true);
@@ -335,17 +336,7 @@ async function startVoting() {
 // Vote for candidate
 async function vote(candidateId) {
     try {
-        const response = await fetch(`/api/vote/${sessionId}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ candidate_id: candidateId })
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to vote');
-        }
+        await sendActions([{ op: 'vote', candidate_id: candidateId, voter_id: voterId }], 'Failed to vote');
     } catch (error) {
         alert(`Error voting: ${error.message}`);
     }
@@ -355,7 +346,23 @@ async function vote(candidateId) {
 function updateUI(session) {
     console.log('Session status:', session.status, 'Preferences:', session.preferences?.length, 'isHost:', isHost);
     
-    if (session.status === 'collecting' && isHost) {
+    // A background search ended without candidates: show its error once.
+    // A fast failure can land between two polls, so the 'searching' state
+    // before it is not always seen
+    const errorKey = session.error && session.error_message ? `${session.error}:${session.error_message}` : null;
+    if (!errorKey || session.status === 'searching') {
+        shownError = null;
+    } else if (errorKey !== shownError) {
+        shownError = errorKey;
+        showError(session.error_message, isHost);
+        return;
+    }
+    
+    if (session.status === 'searching') {
+        hideAllSections();
+        document.getElementById('loading-section').style.display = 'block';
+    } else if (session.status === 'collecting' && isHost) {
+        hideAllSections();
         document.getElementById('session-info').style.display = 'block';
         document.getElementById('preference-header').style.display = 'block';
         document.getElementById('preference-section').style.display = 'block';
@@ -386,7 +393,7 @@ function updateUI(session) {
         if (session.candidates && session.candidates.length > 0) {
             hideAllSections();
             document.getElementById('voting-section').style.display = 'block';
-            renderCards(session.candidates, session.votes || {});
+            renderCards(session.candidates, session.vote_counts || {});
         }
     } else if (session.status === 'completed' && session.winner) {
         hideAllSections();
@@ -412,16 +419,11 @@ function createProgressInfo() {
 }
 
 // Render restaurant cards with vote counts
-function renderCards(candidates, votes = {}) {
+function renderCards(candidates, voteCounts = {}) {
     const container = document.getElementById('cards-container');
     container.innerHTML = '';
     
-    const voteCounts = {};
-    Object.values(votes).forEach(candidateId => {
-        voteCounts[candidateId] = (voteCounts[candidateId] || 0) + 1;
-    });
-    
-    const totalVotes = Object.keys(votes).length;
+    const totalVotes = Object.values(voteCounts).reduce((sum, count) => sum + count, 0);
     const maxVotes = Math.max(...Object.values(voteCounts), 0);
     
     candidates.forEach((candidate) => {
@@ -499,16 +501,53 @@ function displayWinner(winner) {
     }
 }
 
-// Poll for updates
-function startPolling() {
+// Apply a session state to the UI unless we already have a newer one
+function applySession(session) {
+    if (currentSession && (session.version || 0) <= sessionVersion) return;
+    currentSession = session;
+    sessionVersion = session.version || 0;
+    updateUI(session);
+    // A finished session only changes again if the host resets it
+    if (session.status === 'completed' || session.status === 'timeout') stopPolling();
+}
+
+// Send participant actions in one request; the response carries the new
+// session state, so no follow-up poll is needed to see their effect
+async function sendActions(ops, failureMessage) {
+    const response = await fetch(`/api/session/${sessionId}/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ops, since: currentSession ? sessionVersion : undefined })
+    });
+    
+    const data = await response.json();
+    
+    if (!response.ok) {
+        throw new Error(data.error || failureMessage);
+    }
+    
+    // Only the changed fields come back when our copy was current
+    applySession(data.session || { ...currentSession, ...data.changes });
+    return data.results;
+}
+
+// Fetch the session and apply it to the UI
+async function pollOnce(since) {
+    const query = since !== undefined ? `?since=${since}` : '';
+    const response = await fetch(`/api/session/${sessionId}${query}`);
+    if (response.status === 204) return false;
+    if (!response.ok) throw new Error('Session fetch failed');
+    applySession(await response.json());
+    return true;
+}
+
+// Plain 2-second polling, used when long-polling keeps failing
+function startIntervalPolling() {
     if (pollInterval) clearInterval(pollInterval);
     
     pollInterval = setInterval(async () => {
         try {
-            const response = await fetch(`/api/session/${sessionId}`);
-            if (!response.ok) throw new Error('Session fetch failed');
-            const session = await response.json();
-            updateUI(session);
+            await pollOnce();
         } catch (error) {
             console.error('Polling error:', error);
             if (!navigator.onLine) {
@@ -518,6 +557,52 @@ function startPolling() {
     }, 2000);
 }
 
+// Long-poll for updates: the server holds each request until the session
+// version moves past the one we already have
+function startPolling() {
+    stopPolling();
+    sessionVersion = 0;
+    currentSession = null;
+    
+    const loop = {};
+    pollLoop = loop;
+    let failures = 0;
+    
+    (async () => {
+        while (pollLoop === loop) {
+            try {
+                const started = Date.now();
+                const changed = await pollOnce(sessionVersion);
+                failures = 0;
+                // A 204 straight away means the server does not hold
+                // requests (long-poll is off), so poll on an interval
+                if (!changed && Date.now() - started < 1000) {
+                    pollLoop = null;
+                    startIntervalPolling();
+                    return;
+                }
+            } catch (error) {
+                console.error('Long-poll error:', error);
+                if (!navigator.onLine) {
+                    showConnectionError('Lost connection. Retrying...');
+                }
+                if (++failures >= 3) {
+                    pollLoop = null;
+                    startIntervalPolling();
+                    return;
+                }
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        }
+    })();
+}
+
+function stopPolling() {
+    pollLoop = null;
+    if (pollInterval) clearInterval(pollInterval);
+    pollInterval = null;
+}
+
 // Copy link
 function copyLink() {
     const input = document.getElementById('share-link');
@@ -532,7 +617,7 @@ function copyLink() {
 
 // Start new decision
 function startNewDecision() {
-    if (pollInterval) clearInterval(pollInterval);
+    stopPolling();
     sessionId = null;
     isHost = false;
     window.location.href = '/';
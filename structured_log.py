@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the record's `extra` fields inlined"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `burst` records with the same logger and message
+    template per `interval` seconds. The first record of the next window
+    carries a `suppressed` count, so a failing upstream produces a few
+    lines a minute instead of one per request.
+    """
+
+    def __init__(self, interval: float = 60.0, burst: int = 10):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, template) -> [window start, emitted, suppressed]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                window = self._windows[key] = [now, 0, 0]
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+def _configure() -> logging.Logger:
+    root = logging.getLogger('pickit')
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter())
+    handler.addFilter(RateLimitFilter(
+        float(os.getenv('LOG_RATE_LIMIT_INTERVAL', 60)),
+        int(os.getenv('LOG_RATE_LIMIT_BURST', 10))
+    ))
+    root.addHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.propagate = False
+    return root
+
+
+_root = _configure()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the shared 'pickit' handler, e.g. get_logger('search_jobs')"""
+    return _root.getChild(name)
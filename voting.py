@@ -0,0 +1,68 @@
+import random
+from typing import Dict, List, Optional
+
+from session_model import Session
+
+
+def set_candidates(session: Session, candidates: List[Dict]) -> None:
+    """Replace the candidates shown for voting and start a fresh tally"""
+    session.candidates = candidates
+    session.candidate_index = {c['id']: i for i, c in enumerate(candidates)}
+    clear_votes(session)
+
+
+def clear_votes(session: Session) -> None:
+    session.votes = {}
+    session.vote_counts = {}
+
+
+def find_candidate(session: Session, candidate_id: str) -> Optional[Dict]:
+    index = session.candidate_index.get(candidate_id)
+    return session.candidates[index] if index is not None else None
+
+
+def record_vote(session: Session, voter_id: str, candidate_id: str) -> Dict:
+    """
+    Record or move one voter's vote and decide whether the session is over.
+
+    `vote_counts` is kept up to date incrementally, so a vote costs O(1)
+    and the tie-break at the end costs O(candidates) instead of re-counting
+    every vote. Returns the tally result; `winner_id` is None while voting
+    should continue.
+    """
+    votes = session.votes
+    counts = session.vote_counts
+
+    previous = votes.get(voter_id)
+    if previous != candidate_id:
+        if previous is not None:
+            counts[previous] -= 1
+            if counts[previous] == 0:
+                del counts[previous]
+        counts[candidate_id] = counts.get(candidate_id, 0) + 1
+        votes[voter_id] = candidate_id
+
+    votes_cast = len(votes)
+    # One vote per participant (by voter id, however many preferences each
+    # submitted); voters who never submitted one still count
+    expected_votes = max(len(session.participant_ids), votes_cast)
+    result = {
+        'winner_id': None,
+        'winning_votes': 0,
+        'tie_breaker': False,
+        'total_votes': votes_cast,
+        'expected_votes': expected_votes
+    }
+
+    # Only the candidate that just gained a vote can have crossed the majority
+    count = counts[candidate_id]
+    if count > (expected_votes / 2):
+        result.update(winner_id=candidate_id, winning_votes=count)
+        return result
+
+    if votes_cast >= expected_votes and counts:
+        max_votes = max(counts.values())
+        tied = [cid for cid, c in counts.items() if c == max_votes]
+        result.update(winner_id=random.choice(tied), winning_votes=max_votes, tie_breaker=len(tied) > 1)
+
+    return result
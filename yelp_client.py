@@ -1,72 +1,365 @@
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Tuple
 import requests
-from typing import List, Dict
+from result_cache import ResultCache, DiskCacheBackend
+from circuit_breaker import CircuitBreaker
+from http_client import PooledHTTPClient
+from metrics import Counter, Histogram, Gauge, UPSTREAM_BUCKETS, default_registry
+from preferences import plan_queries, preferences_key, rank_businesses
+from restaurant_index import RestaurantIndex
+from structured_log import get_logger
+
+log = get_logger('yelp_client')
 
 YELP_API_KEY = os.getenv('YELP_API_KEY')
-YELP_AI_ENDPOINT = 'https://api.yelp.com/ai/chat/v2'  # Correct v2 endpoint
-YELP_SEARCH_ENDPOINT = 'https://api.yelp.com/v3/businesses/search'
+# Overridable so benchmarks can point at benchmarks/yelp_stub.py
+YELP_AI_ENDPOINT = os.getenv('YELP_AI_ENDPOINT', 'https://api.yelp.com/ai/chat/v2')  # Correct v2 endpoint
+YELP_SEARCH_ENDPOINT = os.getenv('YELP_SEARCH_ENDPOINT', 'https://api.yelp.com/v3/businesses/search')
+
+# Businesses fetched per search; sessions keep them as a pool that
+# regenerate pages through without going back to Yelp
+POOL_PAGE_SIZE = int(os.getenv('YELP_POOL_PAGE_SIZE', 50))
+# Fusion search refuses offset + limit beyond this
+MAX_SEARCH_RESULTS = 240
+
+# 'search' calls only the Fusion search API; 'hedged' also races the AI
+# endpoint against it for a session's first page and takes whichever
+# returns usable businesses first
+SEARCH_STRATEGY = os.getenv('YELP_SEARCH_STRATEGY', 'search').lower()
+AI_TIMEOUT = float(os.getenv('YELP_AI_TIMEOUT', 15))
+SEARCH_TIMEOUT = float(os.getenv('YELP_SEARCH_TIMEOUT', 10))
+
+# Shared keep-alive client for all Yelp traffic
+yelp_http = PooledHTTPClient(
+    pool_size=int(os.getenv('YELP_HTTP_POOL_SIZE', 20)),
+    connect_timeout=float(os.getenv('YELP_CONNECT_TIMEOUT', 3.05)),
+    read_timeout=SEARCH_TIMEOUT,
+    retries=int(os.getenv('YELP_HTTP_RETRIES', 2))
+)
+
+class YelpRequestError(Exception):
+    """4xx response caused by the request itself (not 429), not an outage"""
+
+BREAKER_FAILURES = int(os.getenv('YELP_BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('YELP_BREAKER_RESET_SECONDS', 30))
+ai_breaker = CircuitBreaker('Yelp AI API', BREAKER_FAILURES, BREAKER_RESET_SECONDS, excluded=(YelpRequestError,))
+search_breaker = CircuitBreaker('Yelp search API', BREAKER_FAILURES, BREAKER_RESET_SECONDS, excluded=(YelpRequestError,))
+
+yelp_latency = Histogram(
+    'pickit_yelp_request_duration_seconds',
+    'Yelp API calls by endpoint and outcome, retries included',
+    ('endpoint', 'outcome'),
+    buckets=UPSTREAM_BUCKETS
+)
+yelp_circuit_open = Gauge(
+    'pickit_yelp_circuit_open',
+    '1 while the endpoint is skipped by its circuit breaker',
+    ('endpoint',),
+    mode='max'
+)
+
+def _collect_breakers():
+    yelp_circuit_open.set(int(ai_breaker.state == CircuitBreaker.OPEN), 'ai')
+    yelp_circuit_open.set(int(search_breaker.state == CircuitBreaker.OPEN), 'search')
+
+default_registry.on_collect(_collect_breakers)
+
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv('YELP_HEDGE_WORKERS', 32)), thread_name_prefix='yelp-hedge')
+# Separate from _hedge_pool: a fan-out leg may itself start hedged legs
+_fanout_pool = ThreadPoolExecutor(max_workers=int(os.getenv('YELP_FANOUT_WORKERS', 24)), thread_name_prefix='yelp-fanout')
+
+CACHE_MAX_ENTRIES = int(os.getenv('YELP_CACHE_MAX_ENTRIES', 1000))
+CACHE_MAX_BYTES = int(os.getenv('YELP_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+candidate_cache = ResultCache(
+    ttl=float(os.getenv('YELP_CACHE_TTL', 600)),
+    stale_ttl=float(os.getenv('YELP_CACHE_STALE_TTL', 3600)),
+    max_entries=CACHE_MAX_ENTRIES,
+    max_bytes=CACHE_MAX_BYTES,
+    disk=DiskCacheBackend(os.environ['YELP_CACHE_PATH'], CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if os.getenv('YELP_CACHE_PATH') else None
+)
+
+# Every business Yelp returns is kept here so warm locations can be
+# searched without Yelp; disabled unless RESTAURANT_INDEX_PATH is set
+INDEX_MAX_AGE = float(os.getenv('RESTAURANT_INDEX_MAX_AGE', 86400))
+# Served index results older than this are re-fetched in the background
+INDEX_REFRESH_AGE = float(os.getenv('RESTAURANT_INDEX_REFRESH_AGE', INDEX_MAX_AGE / 2))
+
+restaurant_index = RestaurantIndex(
+    os.environ['RESTAURANT_INDEX_PATH'],
+    max_age=INDEX_MAX_AGE,
+    min_businesses=int(os.getenv('RESTAURANT_INDEX_MIN_BUSINESSES', 100)),
+    min_results=int(os.getenv('RESTAURANT_INDEX_MIN_RESULTS', 12))
+) if os.getenv('RESTAURANT_INDEX_PATH') else None
+
+index_lookups = Counter('pickit_restaurant_index_lookups_total', 'Search legs answered by the local index or not', ('result',))
+_index_refreshing = set()
+_index_lock = threading.Lock()
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+def cache_key(preferences: str, location: str, limit: int, offset: int = 0) -> str:
+    """Key that ignores case, spacing, duplicates and order of preferences"""
+    prefs = sorted({_normalize(p) for p in preferences.split(',') if p.strip()})
+    return f"{_normalize(location)}|{limit}|{offset}|{','.join(prefs)}"
+
+def preferences_search_key(preferences: List[str], location: str, limit: int, offset: int = 0,
+                           hedge: bool = False) -> str:
+    """Key for search_preferences; unlike cache_key, repeated preferences count"""
+    return f"{_normalize(location)}|{limit}|{offset}|{'hedged|' if hedge else ''}{preferences_key(preferences)}"
+
+def search_preferences(preferences: List[str], location: str, limit: int = POOL_PAGE_SIZE, offset: int = 0,
+                       hedge: bool = False) -> Dict:
+    """
+    Search for every participant's preferences at once. They are planned
+    into a few short sub-queries (see preferences.plan_queries) that run
+    concurrently through search_businesses, so each is cached on its own
+    and the wall-clock time is that of the slowest one. With `hedge` (a
+    session's first search) and YELP_SEARCH_STRATEGY=hedged each
+    sub-query also races the AI API. Returns the page as {'businesses',
+    'next_offset', 'exhausted'}, businesses merged and ranked by how many
+    preferences they satisfy. Fails only if every sub-query fails.
+    """
+    leg = _hedged_leg if hedge and SEARCH_STRATEGY == 'hedged' else _search_leg
+    queries = plan_queries(preferences)
+    futures = [_fanout_pool.submit(leg, q.term, location, limit, offset) for q in queries]
+    pages = []
+    errors = []
+    exhausted = True
+    next_offset = offset + limit
+    for query, future in zip(queries, futures):
+        try:
+            businesses, leg_exhausted, leg_next_offset = future.result()
+        except Exception as e:
+            errors.append(e)
+            continue
+        pages.append((query, businesses))
+        exhausted = exhausted and leg_exhausted
+        next_offset = min(next_offset, leg_next_offset)
+    if not pages:
+        raise errors[0]
+
+    return {
+        'businesses': rank_businesses(preferences, pages),
+        'next_offset': next_offset,
+        'exhausted': not errors and (next_offset >= MAX_SEARCH_RESULTS or exhausted)
+    }
+
+def _search_leg(term: str, location: str, limit: int, offset: int) -> Tuple[List[Dict], bool, int]:
+    """
+    One page for one search term, whether Yelp has nothing after it and
+    the offset of the next page. Answered from restaurant_index when it covers the location, refreshing
+    aging results in the background; from Yelp otherwise.
+    """
+    if restaurant_index is not None:
+        hit = restaurant_index.lookup(location, term, limit, offset)
+        index_lookups.inc('hit' if hit else 'miss')
+        if hit is not None:
+            businesses, oldest = hit
+            if time.time() - oldest > INDEX_REFRESH_AGE:
+                _refresh_index(term, location, limit)
+            return businesses, False, offset + limit
+
+    businesses = search_businesses(term, location, limit, offset)
+    return businesses, len(businesses) < limit, offset + limit
+
+def _hedged_leg(term: str, location: str, limit: int, offset: int) -> Tuple[List[Dict], bool, int]:
+    """
+    _search_leg raced against the AI API, so latency is bounded by the
+    fastest healthy backend; the first non-empty answer wins and a leg
+    whose circuit is open fails immediately. The AI API has no paging and
+    answers with a handful of businesses, so an AI answer never ends the
+    results and leaves `offset` to be fetched again. A losing Fusion leg
+    still runs to completion and caches its page.
+    """
+    headers = _headers()
+    search = _hedge_pool.submit(_search_leg, term, location, limit, offset)
+    ai = _hedge_pool.submit(ai_breaker.call, ai_search, term, location, headers, limit)
+    pending = {search, ai}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if search in done and search.exception() is None and search.result()[0]:
+            return search.result()
+        if ai in done and ai.exception() is None and ai.result():
+            return ai.result(), False, offset
+
+    # Nothing usable: an empty Fusion result means no matches, otherwise
+    # surface the Fusion error since that leg is the authoritative one
+    if search.exception() is None:
+        return search.result()
+    if ai.exception() is None:
+        return [], False, offset
+    raise search.exception()
+
+def _refresh_index(term: str, location: str, limit: int) -> None:
+    """Re-fetch a term's first page from Yelp into the index, once at a time"""
+    key = (term, _normalize(location))
+    with _index_lock:
+        if key in _index_refreshing:
+            return
+        _index_refreshing.add(key)
 
-def get_candidates_from_yelp_ai(preferences: str, location: str) -> List[Dict]:
+    def refresh():
+        try:
+            _fetch_and_index(term, location, limit, 0)
+        except Exception as e:
+            log.warning('restaurant index refresh failed', extra={'term': term, 'location': location, 'error': str(e)})
+        finally:
+            with _index_lock:
+                _index_refreshing.discard(key)
+
+    _fanout_pool.submit(refresh)
+
+def search_businesses(preferences: str, location: str, limit: int = POOL_PAGE_SIZE, offset: int = 0) -> List[Dict]:
     """
-    Query Yelp AI API with natural language
+    Fetch one page of raw businesses (trimmed by slim_business), serving
+    repeat searches from candidate_cache. Which Yelp APIs are queried
+    depends on YELP_SEARCH_STRATEGY. Callers format only what they show.
     """
     if not YELP_API_KEY:
         raise ValueError("YELP_API_KEY not set in environment")
 
-    headers = {
+    limit = min(limit, MAX_SEARCH_RESULTS - offset)
+    if limit <= 0:
+        return []
+
+    return candidate_cache.get_or_fetch(
+        cache_key(preferences, location, limit, offset),
+        lambda: _fetch_and_index(preferences, location, limit, offset)
+    )
+
+def _fetch_and_index(preferences: str, location: str, limit: int, offset: int) -> List[Dict]:
+    """Query Yelp and add what it returned to the restaurant index"""
+    businesses = _search(preferences, location, limit, offset)
+    if restaurant_index is not None and businesses:
+        try:
+            restaurant_index.add(location, businesses, candidate_snippet)
+        except Exception as e:
+            log.warning('restaurant index update failed', extra={'location': location, 'error': str(e)})
+    return businesses
+
+def _search(preferences: str, location: str, limit: int, offset: int) -> List[Dict]:
+    """Query Fusion search through its circuit breaker"""
+    return search_breaker.call(fallback_search, preferences, location, _headers(), limit, offset)
+
+def _headers() -> Dict:
+    if not YELP_API_KEY:
+        raise ValueError("YELP_API_KEY not set in environment")
+    return {
         'Authorization': f'Bearer {YELP_API_KEY}',
         'Content-Type': 'application/json'
     }
 
+def ai_search(preferences: str, location: str, headers: Dict, limit: int = 6) -> List[Dict]:
+    """
+    Query Yelp AI API with natural language. Only the businesses the AI
+    returns as structured entities are used; the conversational text is
+    ignored.
+    """
     # AI v2 endpoint expects 'query' parameter
     payload = {
         'query': f"Find highly rated restaurants in {location} for: {preferences}"
     }
 
-    try:
-        response = requests.post(
-            YELP_AI_ENDPOINT,
-            json=payload,
-            headers=headers,
-            timeout=15
-        )
+    response = _timed_request(
+        'ai',
+        'POST',
+        YELP_AI_ENDPOINT,
+        json=payload,
+        headers=headers,
+        read_timeout=AI_TIMEOUT
+    )
 
-        if response.status_code == 200:
-            data = response.json()
-            print(f"AI API Success: {data}")
-            # AI returns conversational text, we need to extract businesses
-            # Use fallback to get structured data
-            return fallback_search(preferences, location, headers)
-        else:
-            print(f"AI API returned {response.status_code}: {response.text}")
-            return fallback_search(preferences, location, headers)
+    if response.status_code != 200:
+        raise _response_error('Yelp AI API error', response)
 
-    except Exception as e:
-        print(f"Yelp AI API error: {e}")
-        return fallback_search(preferences, location, headers)
+    data = response.json()
+    businesses = []
+    for entity in data.get('entities', []) or []:
+        businesses.extend(entity.get('businesses', []) or [])
+    return [slim_business(biz) for biz in businesses[:limit]]
 
-def fallback_search(preferences: str, location: str, headers: Dict) -> List[Dict]:
+def fallback_search(preferences: str, location: str, headers: Dict, limit: int = 6, offset: int = 0) -> List[Dict]:
     """Fallback to Yelp Fusion search API"""
     
     params = {
         'term': preferences,
         'location': location,
-        'limit': 6,
+        'limit': limit,
         'sort_by': 'rating'
     }
+    if offset:
+        params['offset'] = offset
     
-    response = requests.get(
+    response = _timed_request(
+        'search',
+        'GET',
         YELP_SEARCH_ENDPOINT,
         params=params,
         headers=headers,
-        timeout=10
+        read_timeout=SEARCH_TIMEOUT
     )
     
     if response.status_code == 200:
         data = response.json()
-        return format_candidates(data.get('businesses', []))
+        return [slim_business(biz) for biz in data.get('businesses', [])]
     else:
-        raise Exception(f"Yelp API error: {response.status_code}")
+        raise _response_error('Yelp API error', response)
+
+def _timed_request(endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request through yelp_http, recording its duration and outcome"""
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = yelp_http.request(method, url, **kwargs)
+        if response.status_code == 200:
+            outcome = 'ok'
+        elif response.status_code == 429:
+            outcome = 'rate_limited'
+        elif response.status_code < 500:
+            outcome = 'client_error'
+        else:
+            outcome = 'server_error'
+        return response
+    except requests.Timeout:
+        outcome = 'timeout'
+        raise
+    except requests.ConnectionError:
+        outcome = 'connection_error'
+        raise
+    finally:
+        yelp_latency.observe(time.perf_counter() - start, endpoint, outcome)
+
+def slim_business(biz: Dict) -> Dict:
+    """Keep only the fields format_candidates reads, so pooled pages stay small"""
+    location = biz.get('location') or {}
+    return {
+        'id': biz.get('id', ''),
+        'name': biz.get('name', ''),
+        'rating': biz.get('rating', 0),
+        'price': biz.get('price', '$$'),
+        'categories': [{'title': c.get('title', '')} for c in biz.get('categories', [])],
+        'location': {
+            'display_address': location.get('display_address', []),
+            'formatted_address': location.get('formatted_address', '')
+        },
+        'phone': biz.get('phone', ''),
+        'url': biz.get('url', ''),
+        'image_url': biz.get('image_url', ''),
+        'review_count': biz.get('review_count', 0)
+    }
+
+def _response_error(prefix: str, response) -> Exception:
+    message = f"{prefix}: {response.status_code}"
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        return YelpRequestError(message)
+    return Exception(message)
 
 def format_candidates(businesses: List[Dict]) -> List[Dict]:
     """Format businesses for our app"""
@@ -78,10 +371,14 @@ def format_candidates(businesses: List[Dict]) -> List[Dict]:
             'rating': biz.get('rating', 0),
             'price': biz.get('price', '$$'),
             'categories': [c.get('title', '') for c in biz.get('categories', [])],
-            'address': ', '.join(biz.get('location', {}).get('display_address', [])),
+            'address': ', '.join(biz.get('location', {}).get('display_address', []))
+                       or biz.get('location', {}).get('formatted_address', ''),
             'phone': biz.get('phone', ''),
             'url': biz.get('url', ''),
             'image_url': biz.get('image_url', ''),
-            'snippet': f"Highly rated {biz.get('categories', [{}])[0].get('title', 'restaurant')} with {biz.get('review_count', 0)} reviews"
+            'snippet': candidate_snippet(biz)
         })
     return candidates
+
+def candidate_snippet(biz: Dict) -> str:
+    return f"Highly rated {(biz.get('categories') or [{}])[0].get('title', 'restaurant')} with {biz.get('review_count', 0)} reviews"